@@ -1,40 +1,18 @@
-import pandas as pd
-from shapely.geometry import Point
-from geopy.distance import geodesic
+from project.model.hazard import interpolate_csv, join_csv
 
-# Load both CSVs
-roads_df = pd.read_csv("project/data/flood_roads_with_coords.csv")  # Has longitude, latitude columns
-points_df = pd.read_csv("project/data/AEGISDataset.csv")  # Has latitude, longitude, flood_height, elevation, precipitation
+# Roads (has longitude, latitude of the first vertex and the WKT linestring) and
+# AEGIS flood points (latitude, longitude, flood_heig, elevation, precipitat)
+roads_csv = "project/data/flood_roads_with_coords.csv"
+points_csv = "project/data/AEGISDataset.csv"
 
+# Attach the nearest flood point within 200 m of each road's first vertex.
+# Use along="line" to match against the whole linestring instead.
+n_roads = join_csv(roads_csv, points_csv, "project/data/flood_roads_enriched.csv", max_distance=200, along="first")
 
-# Create a function to find the nearest point (within max_distance in meters)
-def find_nearest_flood_data(road_lat, road_lon, flood_points, max_distance=200):
-    road_point = (road_lat, road_lon)
-    nearest = None
-    min_dist = float('inf')
+print(f"Merged dataset saved to 'flood_roads_enriched.csv' ({n_roads} roads)")
 
-    print(f"Road: ({road_lat}, {road_lon})")
+# Inverse-distance-weighted hazard sampled every 25 m along each road, summarised
+# as per-road min/mean/max; cell=25 evaluates the field once on a 25 m grid
+n_roads = interpolate_csv(roads_csv, points_csv, "project/data/flood_roads_interpolated.csv", spacing=25, cell=25)
 
-    for _, row in flood_points.iterrows():
-        flood_point = (row['latitude'], row['longitude'])
-        dist = geodesic(road_point, flood_point).meters
-
-        print(f"  Flood: ({flood_point[0]}, {flood_point[1]}) => Distance: {dist:.2f}m")
-
-        if dist < min_dist and dist <= max_distance:
-            min_dist = dist
-            nearest = row
-
-    return nearest if nearest is not None else pd.Series([None, None, None],
-                                                         index=['flood_height', 'elevation', 'precipitation'])
-
-
-# Apply nearest matching
-merged_data = roads_df.copy()
-merged_data[['flood_height', 'elevation', 'precipitation']] = roads_df.apply(
-    lambda row: find_nearest_flood_data(row['latitude'], row['longitude'], points_df), axis=1
-)
-
-# Save the result
-merged_data.to_csv("project/data/flood_roads_enriched.csv", index=False)
-print("Merged dataset saved to 'flood_roads_enriched.csv'")
+print(f"Interpolated hazard saved to 'flood_roads_interpolated.csv' ({n_roads} roads)")
@@ -1,14 +1,20 @@
 import pandas as pd
-from shapely import wkt
-import networkx as nx
-import pickle
+import shapely
+
+from model.distance import polyline_length
+from model.graph_store import build_artifact, load_graph
 
 df = pd.read_csv("data/final_data/RoadMapWithHazard.csv")
 
 # === Step 2: Parse Geometry ===
-df['geometry'] = df['WKT'].apply(wkt.loads)
-df['start'] = df['geometry'].apply(lambda line: line.coords[0])
-df['end'] = df['geometry'].apply(lambda line: line.coords[-1])
+# One vectorized pass over the WKT column instead of a Python call per row
+geoms = shapely.from_wkt(df['WKT'].to_numpy())
+xy, line = shapely.get_coordinates(geoms, return_index=True)
+first = shapely.get_coordinates(shapely.get_point(geoms, 0))
+last = shapely.get_coordinates(shapely.get_point(geoms, -1))
+df['geometry'] = geoms
+df['start'] = list(map(tuple, first.tolist()))
+df['end'] = list(map(tuple, last.tolist()))
 
 # === Step 3: Clean & Feature Engineer ===
 # Fill missing lane info with 1 (default)
@@ -24,25 +30,18 @@ df['surface_encoded'] = df['surface'].astype('category').cat.codes
 # Fill Var_mean with fallback (default weight = 1)
 df['Var_mean'] = pd.to_numeric(df['Var_mean'], errors='coerce').fillna(1.0)
 
-# Optional: compute length
-df['length'] = df['geometry'].apply(lambda line: line.length)
-
-# === Step 4: Create Graph ===
-G = nx.Graph()
-
-for _, row in df.iterrows():
-    start = row['start']
-    end = row['end']
-    weight = row['Var_mean']  # You can customize this
-    G.add_edge(start, end, weight=weight, attr=row.to_dict())
+# Road length in metres (ellipsoidal), summed over the vertices of each line
+df['length'] = polyline_length(xy, line, n_lines=len(df))
 
-# === Step 5: Export Cleaned Data ===
+# === Step 4: Export Cleaned Data ===
 df.to_csv("data/final_data/preprocessed_Map.csv", index=False)
-with open("data/final_data/road_graph.gpickle", "wb") as f:
-    pickle.dump(G, f)
-with open("data/final_data/road_graph.gpickle", "rb") as f:
-    G = pickle.load(f)
-
-print("✅ Preprocessing complete")
 
+# === Step 5: Build Graph Artifact ===
+# Memory-mapped road graph under data/final_data/graph_cache/, keyed by a hash of
+# preprocessed_Map.csv and the build parameters. Edge attributes are typed
+# columns indexed by edge id; ``road`` points back at the row of the CSV above
+artifact = build_artifact("data/final_data/preprocessed_Map.csv")
+G = load_graph(artifact)
 
+print(f"Graph artifact: {artifact} ({G.n_nodes} nodes, {G.n_edges} edges)")
+print("✅ Preprocessing complete")
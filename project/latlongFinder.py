@@ -1,55 +1,34 @@
 import pandas as pd
-import requests
-import time
 from tqdm import tqdm  # For progress bars (install with: pip install tqdm)
 
+from model.overpass import OverpassFetcher, way_id
+
 # Load the CSV
 df = pd.read_csv('data/Bagong Silangan Road Map - FixedRoadMap.csv')
 
+# Fetch every way's geometry in batched Overpass queries; responses are cached in cache/
+fetcher = OverpassFetcher()
+with tqdm(total=df['id'].nunique(), unit='way') as bar:
+    geometries = fetcher.fetch_ways(df['id'], progress=bar.update)
+if fetcher.failed:
+    print(f"{len(fetcher.failed)} ways could not be fetched; run again to retry them")
 
-def get_way_coordinates(osm_id):
-    try:
-        # Extract the numeric ID (e.g., "way/24158513" → 24158513)
-        way_id = osm_id.split('/')[-1]
-
-        # Overpass API query to fetch the way's nodes (coordinates)
-        overpass_url = "https://overpass-api.de/api/interpreter"
-        query = f"""
-        [out:json];
-        way({way_id});
-        out geom;
-        """
-
-        response = requests.get(overpass_url, params={'data': query})
-        data = response.json()
 
-        if not data['elements']:
-            print(f"No data for {osm_id}")
-            return None, None
-
-        # Extract all nodes (coordinates) of the way
-        geometry = data['elements'][0].get('geometry', [])
-        if not geometry:
-            print(f"No geometry for {osm_id}")
-            return None, None
-
-        # Calculate centroid (average of all coordinates)
-        lats = [point['lat'] for point in geometry]
-        lons = [point['lon'] for point in geometry]
-        avg_lat = sum(lats) / len(lats)
-        avg_lon = sum(lons) / len(lons)
-
-        return avg_lat, avg_lon
+def get_way_coordinates(osm_id):
+    geometry = geometries.get(way_id(osm_id))
+    if not geometry:
+        print(f"No geometry for {osm_id}")
+        return None, None, None
 
-    except Exception as e:
-        print(f"Error for {osm_id}: {str(e)}")
-        return None, None
+    # Calculate centroid (average of all coordinates)
+    avg_lon = sum(lon for lon, _ in geometry) / len(geometry)
+    avg_lat = sum(lat for _, lat in geometry) / len(geometry)
+    wkt = "LINESTRING (" + ", ".join(f"{lon} {lat}" for lon, lat in geometry) + ")"
+    return avg_lat, avg_lon, wkt
 
 
-# Apply the function with a progress bar
-tqdm.pandas()  # Enable progress_apply
-df['latitude'], df['longitude'] = zip(*df['id'].progress_apply(get_way_coordinates))
+df['latitude'], df['longitude'], df['geometry'] = zip(*df['id'].apply(get_way_coordinates))
 
 # Save to CSV
 df.to_csv('data/Bagong_Silangan_Road_Map_with_coordinates.csv', index=False)
-print("Done! Coordinates saved.")
\ No newline at end of file
+print("Done! Coordinates saved.")
@@ -0,0 +1,271 @@
+"""Alternative evacuation routes between a node and a shelter.
+
+:class:`AlternativeRoutes` returns up to ``k`` routes that share at most
+``max_overlap`` of their length with every route before them and cost at
+most ``max_stretch`` times the best one. Three methods are offered:
+
+``"plateau"``
+    One forward search from the origin and one reverse search from the
+    shelter. Edges on both shortest-path trees form plateaus. Each plateau
+    gives a via route (origin tree to the plateau, shelter tree from it).
+    Routes with long plateaus come first. The cost is two searches, whatever
+    ``k`` is.
+``"penalty"``
+    Repeated searches where the edges of earlier routes cost
+    ``(1 + penalty)`` times more per use, until enough dissimilar routes are
+    found.
+``"yen"``
+    Yen's k shortest loopless paths, in cost order, filtered by overlap. This
+    is the exact, expensive option. Near-duplicate paths are enumerated
+    before a dissimilar one turns up, and enumeration stops after ``10 * k``
+    paths. On a large grid, ``k=5`` costs about ten single searches and
+    often returns fewer than ``k`` routes at the default ``max_overlap``.
+
+``"plateau"`` is the default, and the only method whose cost does not grow with ``k``.
+
+The penalty and Yen searches are A* towards the shelter, guided by the
+distances of its reverse tree. Those distances are exact on the unmodified
+graph and remain a lower bound once edges are penalised or blocked. So each
+search follows the cheapest remaining route almost directly instead of
+flooding the graph. The reverse tree is computed once per shelter and shared
+by every query towards it. The ``max_trees`` most recently used trees are kept.
+"""
+import heapq
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from .routing import walk_predecessors
+
+Route = namedtuple("Route", ["path", "cost", "length", "exposure", "overlap"])
+Route.__doc__ = """One alternative: node ``path``, its ``cost`` under the weight profile, ``length`` in metres,
+flood ``exposure`` (sum of ``length * var_mean`` over its edges) and its largest ``overlap`` with an earlier route."""
+
+METHODS = ("plateau", "penalty", "yen")
+
+
+def _astar(graph, weights, source, target, remaining, blocked_nodes=(), blocked_edges=(), limit=np.inf):
+    """A* from ``source`` to ``target`` with ``remaining[v]`` bounding the cost left from ``v``.
+
+    ``weights`` is a list of edge costs. Returns ``(path, cost, settled)``, with
+    a None path if ``target`` cannot be reached within ``limit`` around the
+    blocked nodes and edges.
+    """
+    offsets, targets = graph.offsets, graph.targets
+    dist = {source: 0.0}
+    predecessors = {source: -1}
+    settled = set()
+    # Ties on the estimate go to the node furthest along, which follows one of several equal routes
+    heap = [(remaining[source], 0.0, source)]
+    while heap:
+        f, _, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        if f > limit:
+            break
+        settled.add(u)
+        if u == target:
+            break
+        d = dist[u]
+        start, stop = int(offsets[u]), int(offsets[u + 1])
+        for e, v in zip(range(start, stop), targets[start:stop].tolist()):
+            if v in blocked_nodes or e in blocked_edges or v in settled:
+                continue
+            nd = d + weights[e]
+            if nd < dist.get(v, np.inf):
+                dist[v] = nd
+                predecessors[v] = u
+                heapq.heappush(heap, (nd + remaining[v], -nd, v))
+    if target not in settled:
+        return None, np.inf, len(settled)
+    path = [target]
+    while predecessors[path[-1]] >= 0:
+        path.append(predecessors[path[-1]])
+    return path[::-1], dist[target], len(settled)
+
+
+class AlternativeRoutes:
+    """Up to ``k`` dissimilar routes from a node to a shelter, with their length and flood exposure.
+
+    ``settled`` holds the number of nodes settled by the A* searches of the
+    last query, and ``searches`` the number of full tree searches it ran
+    (0 when the shelter's reverse tree was already cached).
+    """
+
+    def __init__(self, graph, profile="length", max_overlap=0.6, max_stretch=1.5, penalty=0.5, max_trees=16):
+        self.graph = graph
+        self.profile = profile
+        self.max_overlap = max_overlap
+        self.max_stretch = max_stretch
+        self.penalty = penalty
+        self.max_trees = max_trees
+        self.settled = 0
+        self.searches = 0
+        self._trees = OrderedDict()
+        self._version = None
+
+    def _check_version(self):
+        if self._version != self.graph.version:
+            self._trees.clear()
+            self._weights = self.graph.edge_weights(self.profile)
+            self._weight_list = self._weights.tolist()
+            self._version = self.graph.version
+
+    def reverse_tree(self, target):
+        """``(distance, next_hop, distance list)`` of the reverse shortest-path tree rooted at ``target``."""
+        from scipy.sparse.csgraph import dijkstra
+
+        self._check_version()
+        if target in self._trees:
+            self._trees.move_to_end(target)
+            return self._trees[target]
+        dist, next_hop = dijkstra(self.graph.to_csr_matrix(self.profile, reverse=True), indices=target,
+                                  return_predecessors=True)
+        self._trees[target] = (dist, next_hop, dist.tolist())
+        self.searches += 1
+        if len(self._trees) > self.max_trees:
+            self._trees.popitem(last=False)
+        return self._trees[target]
+
+    def routes(self, source, target, k=3, method="plateau"):
+        """Up to ``k`` :class:`Route` from ``source`` to ``target``, best first; empty if unreachable."""
+        if method not in METHODS:
+            raise ValueError(f"Unknown alternative route method: {method!r}")
+        source, target = int(source), int(target)
+        self.settled = self.searches = 0
+        if source == target:
+            return [Route([source], 0.0, 0.0, 0.0, 0.0)]
+        dist, next_hop, _ = self.reverse_tree(target)
+        if not np.isfinite(dist[source]):
+            return []
+        candidates = getattr(self, f"_{method}")(source, target, k)
+        # Yen yields paths in cost order, so the first one over the stretch limit ends the query
+        return self._select(candidates, k, dist[source], ordered=method == "yen")
+
+    def _select(self, candidates, k, best, ordered):
+        """Keep candidate paths, in order, within the stretch limit and overlap constraint."""
+        graph = self.graph
+        accepted, edge_sets = [], []
+        for path in candidates:
+            edges = graph.edge_ids(path[:-1], path[1:])
+            cost = float(self._weights[edges].sum())
+            if cost > self.max_stretch * best * (1 + 1e-12):
+                if ordered:
+                    break
+                continue
+            overlap = self._overlap(edges, edge_sets)
+            if overlap > self.max_overlap:
+                continue
+            length = graph.length[edges]
+            exposure = float((length * graph.var_mean[edges]).sum())
+            accepted.append(Route(list(path), cost, float(length.sum()), exposure, overlap))
+            edge_sets.append(edges)
+            if len(accepted) == k:
+                break
+        return accepted
+
+    def _overlap(self, edges, edge_sets):
+        """Largest share of the length of ``edges`` that lies on any of ``edge_sets``."""
+        length = self.graph.length[edges]
+        total = float(length.sum())
+        return max((float(length[np.isin(edges, other)].sum()) / total if total > 0 else 1.0
+                    for other in edge_sets), default=0.0)
+
+    def _plateau(self, source, target, k):
+        """Via routes through the plateaus shared by the forward and reverse trees, cheapest net of plateau first."""
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components, dijkstra
+
+        graph = self.graph
+        dist_t, next_hop, _ = self.reverse_tree(target)
+        dist_s, pred = dijkstra(graph.to_csr_matrix(self.profile), indices=source, return_predecessors=True)
+        self.searches += 1
+        u, v = graph.sources, graph.targets
+        on_both = (pred[v] == u) & (next_hop[u] == v)
+        n = graph.n_nodes
+        labels = connected_components(coo_matrix((np.ones(on_both.sum()), (u[on_both], v[on_both])), shape=(n, n)),
+                                      directed=False)[1]
+        plateau = labels[u[on_both]]
+        plateau_length = np.bincount(plateau, weights=self._weights[on_both], minlength=n)
+        via_cost = dist_s + dist_t
+        in_plateau = np.zeros(n, dtype=bool)
+        in_plateau[u[on_both]] = in_plateau[v[on_both]] = True
+        nodes = np.flatnonzero(in_plateau & (via_cost <= self.max_stretch * dist_t[source] * (1 + 1e-12)))
+        # One via node per plateau, plateaus ranked by route cost minus the length they share with the trees
+        order = nodes[np.lexsort((via_cost[nodes], via_cost[nodes] - plateau_length[labels[nodes]]))]
+        _, first = np.unique(labels[order], return_index=True)
+        for via in order[np.sort(first)].tolist():
+            path = walk_predecessors(pred, via)[::-1] + walk_predecessors(next_hop, via)[1:]
+            if len(set(path)) == len(path):
+                yield path
+
+    def _penalty(self, source, target, k):
+        """Searches on weights raised by ``(1 + penalty)`` per earlier use of an edge."""
+        _, _, remaining = self.reverse_tree(target)
+        weights = list(self._weight_list)
+        for _ in range(4 * k):
+            path, _, settled = _astar(self.graph, weights, source, target, remaining)
+            self.settled += settled
+            yield path
+            for e in self.graph.edge_ids(path[:-1], path[1:]).tolist():
+                weights[e] *= 1 + self.penalty
+
+    def _yen(self, source, target, k):
+        """Yen's loopless paths in cost order; spur searches are A* on the shelter's reverse tree distances.
+
+        Paths are only spurred from the node where they left their parent
+        (Lawler's rule), and spur routes that would break the stretch limit
+        are not searched for.
+        """
+        graph = self.graph
+        _, next_hop, remaining = self.reverse_tree(target)
+        weights = self._weight_list
+        limit = self.max_stretch * remaining[source] * (1 + 1e-12)
+        found = [walk_predecessors(next_hop, source)]
+        deviations = [0]
+        candidates, seen = [], {tuple(found[0])}
+        yield found[0]
+        # Enough candidates for the overlap filter to pick k routes in most cases
+        while len(found) < 10 * k:
+            last = found[-1]
+            edges = graph.edge_ids(last[:-1], last[1:]).tolist()
+            root_cost = np.concatenate([[0.0], np.cumsum([weights[e] for e in edges])])
+            # Leading nodes every found path shares with the last one
+            shared = []
+            for p in found:
+                m = min(len(p), len(last))
+                differ = np.flatnonzero(np.asarray(p[:m]) != np.asarray(last[:m]))
+                shared.append(differ[0] if len(differ) else m)
+            root_nodes = set(last[:deviations[-1]])
+            for i in range(deviations[-1], len(last) - 1):
+                spur = last[i]
+                blocked_edges = {graph.edge_id(p[i], p[i + 1]) for p, n in zip(found, shared) if n > i and len(p) > i + 1}
+                path, cost, settled = self._spur(spur, target, next_hop, remaining, root_nodes, blocked_edges,
+                                                 limit - root_cost[i])
+                self.settled += settled
+                root_nodes.add(spur)
+                if path is not None and tuple(last[:i] + path) not in seen:
+                    seen.add(tuple(last[:i] + path))
+                    heapq.heappush(candidates, (root_cost[i] + cost, i, last[:i] + path))
+            if not candidates:
+                return
+            _, deviation, path = heapq.heappop(candidates)
+            found.append(path)
+            deviations.append(deviation)
+            yield path
+
+    def _spur(self, spur, target, next_hop, remaining, blocked_nodes, blocked_edges, limit):
+        """Cheapest route from ``spur`` avoiding the blocked nodes and edges; the tree route when it is still open."""
+        path = [spur]
+        if next_hop[spur] >= 0 and self.graph.edge_id(spur, next_hop[spur]) not in blocked_edges:
+            while next_hop[path[-1]] >= 0 and path[-1] not in blocked_nodes:
+                path.append(int(next_hop[path[-1]]))
+            if path[-1] == target and blocked_nodes.isdisjoint(path):
+                cost = remaining[spur]
+                return (path, cost, 0) if cost <= limit else (None, np.inf, 0)
+        return _astar(self.graph, self._weight_list, spur, target, remaining, blocked_nodes, blocked_edges, limit)
+
+
+def alternative_routes(graph, source, target, k=3, method="plateau", profile="length", **options):
+    """Up to ``k`` :class:`Route` from ``source`` to ``target``; see :class:`AlternativeRoutes` for ``options``."""
+    return AlternativeRoutes(graph, profile, **options).routes(source, target, k, method)
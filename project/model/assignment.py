@@ -0,0 +1,204 @@
+"""Static traffic assignment of evacuee flows with BPR link delays.
+
+Each directed edge has a free-flow travel time (length over a speed for its
+``highway`` class) and a capacity (``lanes`` times a per-lane capacity for
+its class). Its travel time grows with the flow on it following the BPR
+function ``t0 * (1 + alpha * (volume / capacity) ** beta)``.
+
+:class:`TrafficAssignment` finds the user equilibrium, where no evacuee can
+reach a shelter faster by switching routes, with the Frank-Wolfe algorithm or
+its conjugate variant. Its all-or-nothing step loads the demand of every
+origin onto shortest-path trees towards the shelters. The reverse trees come
+from one multi-source csgraph Dijkstra, or one per shelter when origins keep
+their shelter. Flows are pushed down the trees level by level over
+array-backed link flows.
+"""
+import warnings
+
+import numpy as np
+
+from .road_graph import BRIDGE_ATTRIBUTES, HIGHWAY_CLASSES
+from .routing import tree_accumulate
+
+# Per-lane capacity (evacuees or vehicles per hour) and free-flow speed (km/h) by highway class
+LANE_CAPACITY = {
+    "motorway": 2000, "trunk": 1800, "primary": 1600, "secondary": 1400, "tertiary": 1200,
+    "unclassified": 900, "residential": 800, "living_street": 500, "service": 600, "track": 400,
+    "pedestrian": 1500, "path": 600, "footway": 900, "cycleway": 600, "steps": 400,
+}
+FREE_FLOW_SPEED = {
+    "motorway": 80, "trunk": 60, "primary": 50, "secondary": 40, "tertiary": 30,
+    "unclassified": 25, "residential": 20, "living_street": 10, "service": 15, "track": 10,
+    "pedestrian": 5, "path": 5, "footway": 5, "cycleway": 10, "steps": 3,
+}
+# Edges without a known class, such as gap bridges
+DEFAULT_CLASS = "residential"
+
+
+def _by_class(graph, table):
+    values = np.array([table[name] for name in HIGHWAY_CLASSES] + [table[DEFAULT_CLASS]], dtype=np.float64)
+    return values[np.where(graph.highway >= 0, graph.highway, len(HIGHWAY_CLASSES))]
+
+
+def link_capacity(graph):
+    """Capacity per hour of every edge: ``lanes`` times the per-lane capacity of its class."""
+    lanes = np.where(graph.lanes > 0, graph.lanes, BRIDGE_ATTRIBUTES["lanes"])
+    return lanes * _by_class(graph, LANE_CAPACITY)
+
+
+def free_flow_time(graph):
+    """Travel time in seconds of every edge at its class's free-flow speed; closed edges take ``inf``."""
+    t0 = graph.length / (_by_class(graph, FREE_FLOW_SPEED) / 3.6)
+    return np.where(graph.closed, np.inf, t0)
+
+
+def bpr(t0, volume, capacity, alpha=0.15, beta=4.0):
+    """BPR link travel time for ``volume`` on links with free-flow time ``t0``."""
+    return t0 * (1 + alpha * (volume / capacity) ** beta)
+
+
+class TrafficAssignment:
+    """Equilibrium assignment of evacuees from ``origins`` to ``shelters``.
+
+    ``demand[i]`` evacuees per hour leave node ``origins[i]``. By default each
+    heads for whichever shelter is currently quickest; with ``targets`` (the
+    position in ``shelters`` per origin) every origin keeps its shelter.
+    After :meth:`run`, ``volume`` and ``time`` hold the per-edge flow and
+    travel time, ``gaps`` the relative gap of every iteration and
+    ``converged`` whether the last gap got below ``tol``.
+    """
+
+    def __init__(self, graph, origins, demand, shelters, targets=None, alpha=0.15, beta=4.0):
+        from scipy.sparse import csr_matrix
+
+        self.graph = graph
+        self.shelters = np.atleast_1d(np.asarray(shelters, dtype=np.int64))
+        origins = np.atleast_1d(np.asarray(origins, dtype=np.int64))
+        demand = np.broadcast_to(np.asarray(demand, dtype=np.float64), origins.shape)
+        n = graph.n_nodes
+        if targets is None:
+            self._loads = [(self.shelters, np.bincount(origins, weights=demand, minlength=n))]
+        else:
+            targets = np.asarray(targets, dtype=np.int64)
+            self._loads = [
+                (self.shelters[[s]], np.bincount(origins[targets == s], weights=demand[targets == s], minlength=n))
+                for s in np.unique(targets)
+            ]
+        self.alpha, self.beta = alpha, beta
+        self.t0 = free_flow_time(graph)
+        self.capacity = link_capacity(graph)
+        self.volume = np.zeros(graph.n_edges)
+        self.time = self.t0.copy()
+        self.gaps = []
+        self.converged = False
+        self.unassigned = 0.0
+        # Reverse adjacency whose data slots map back to edge ids, refilled with new times each step
+        reverse = csr_matrix((np.arange(1, graph.n_edges + 1, dtype=np.float64), graph.targets, graph.offsets),
+                             shape=(n, n)).T.tocsr()
+        self._reverse_edge = reverse.data.astype(np.int64) - 1
+        self._reverse = reverse
+
+    def all_or_nothing(self, time):
+        """Edge flows when every evacuee takes a fastest route under ``time``; also returns unassigned demand."""
+        from scipy.sparse.csgraph import dijkstra
+
+        graph = self.graph
+        self._reverse.data = time[self._reverse_edge]
+        flow = np.zeros(graph.n_edges)
+        unassigned = 0.0
+        for shelters, load in self._loads:
+            _, next_hop, _ = dijkstra(self._reverse, indices=shelters, min_only=True, return_predecessors=True)
+            has_next = next_hop >= 0
+            reached = has_next.copy()
+            reached[shelters] = True
+            unassigned += load[~reached].sum()
+            load = np.where(reached, load, 0.0)
+            nodes = np.flatnonzero(has_next)
+            edge = np.full(graph.n_nodes, -1, dtype=np.int64)
+            edge[nodes] = graph.edge_ids(nodes, next_hop[nodes])
+            # Push loads towards the shelters, deepest nodes first, one tree level at a time
+            depth = tree_accumulate(graph, next_hop, np.ones(graph.n_edges)).astype(np.int64)
+            order = nodes[np.argsort(-depth[nodes], kind="stable")]
+            bounds = np.flatnonzero(np.diff(depth[order])) + 1
+            for level in np.split(order, bounds):
+                np.add.at(load, next_hop[level], load[level])
+                flow[edge[level]] += load[level]
+        return flow, unassigned
+
+    def _objective_slope(self, x, direction, step):
+        """Derivative of the Beckmann objective along ``direction`` at ``x + step * direction``."""
+        o = self._open
+        return bpr(self.t0[o], x[o] + step * direction[o], self.capacity[o], self.alpha, self.beta) @ direction[o]
+
+    def _line_search(self, x, direction, tol=1e-6):
+        """Step in ``[0, 1]`` minimising the objective along ``direction`` (bisection on its slope)."""
+        if self._objective_slope(x, direction, 1.0) <= 0:
+            return 1.0
+        lo, hi = 0.0, 1.0
+        while hi - lo > tol:
+            mid = (lo + hi) / 2
+            if self._objective_slope(x, direction, mid) > 0:
+                hi = mid
+            else:
+                lo = mid
+        return (lo + hi) / 2
+
+    def run(self, max_iter=200, tol=1e-4, method="cfw"):
+        """Iterate until the relative gap is below ``tol``; ``method`` is ``"fw"`` or ``"cfw"`` (conjugate).
+
+        Stopping at ``max_iter`` first leaves ``converged`` False and warns.
+        """
+        if method not in ("fw", "cfw"):
+            raise ValueError(f"Unknown assignment method: {method!r}")
+        self._open = np.isfinite(self.t0)
+        x, self.unassigned = self.all_or_nothing(self.t0)
+        previous = None
+        self.gaps = []
+        self.converged = False
+        for _ in range(max_iter):
+            time = bpr(self.t0, x, self.capacity, self.alpha, self.beta)
+            y, _ = self.all_or_nothing(time)
+            # Closed edges (t0 = inf) carry no flow; masking first avoids inf * 0
+            open_time = time[self._open]
+            used = open_time @ x[self._open]
+            gap = (used - open_time @ y[self._open]) / used if used > 0 else 0.0
+            self.gaps.append(gap)
+            if gap < tol:
+                self.converged = True
+                break
+            target = y
+            if method == "cfw" and previous is not None:
+                # Conjugate direction: combine with the previous target so the steps stay
+                # conjugate under the (diagonal) Hessian of the objective
+                o = self._open
+                slope = np.zeros_like(x)
+                slope[o] = (self.t0[o] * self.alpha * self.beta * (x[o] / self.capacity[o]) ** (self.beta - 1)
+                            / self.capacity[o])
+                old, new = previous - x, y - x
+                denominator = (old * slope * (new - old)).sum()
+                weight = (old * slope * new).sum() / denominator if denominator != 0 else 0.0
+                weight = min(max(weight, 0.0), 0.99)
+                target = weight * previous + (1 - weight) * y
+            step = self._line_search(x, target - x)
+            x = x + step * (target - x)
+            previous = target
+        self.volume = x
+        self.time = bpr(self.t0, x, self.capacity, self.alpha, self.beta)
+        if not self.converged:
+            warnings.warn(f"Assignment stopped after {max_iter} iterations at relative gap "
+                          f"{self.gaps[-1] if self.gaps else float('nan'):.2e} (tol {tol:.0e})",
+                          RuntimeWarning, stacklevel=2)
+        return self
+
+    def road_report(self):
+        """Per ``preprocessed_Map.csv`` row: peak directional ``volume``, its ``capacity`` and ``vc`` ratio.
+
+        Rows are indexed by road; gap-bridging edges are left out.
+        """
+        import pandas as pd
+
+        graph = self.graph
+        vc = self.volume / self.capacity
+        frame = pd.DataFrame({"road": graph.road, "volume": self.volume, "capacity": self.capacity, "vc": vc})
+        frame = frame[frame["road"] >= 0].sort_values("vc", ascending=False)
+        return frame.groupby("road").first().sort_index()
@@ -0,0 +1,241 @@
+"""Headless routing of origin(-destination) tables, streamed to a results file.
+
+The input is a CSV or Parquet file with ``origin_lon``/``origin_lat`` columns,
+optionally ``destination_lon``/``destination_lat`` and an ``id`` column.
+Rows without a destination are routed to their nearest shelter. The input is
+read in chunks of ``chunksize`` rows, and at most two chunks per worker are
+in flight at once, so memory stays flat however long the input is.
+
+Every worker opens the memory-mapped graph artifact (see :mod:`.sweep`) and
+builds the nearest-shelter tree once, with route lengths and risks for every
+node summed over the tree. A nearest-shelter route then costs one snap plus a
+walk along the tree. Routes to explicit destinations share one reverse search
+per distinct destination node in the chunk.
+
+Each route becomes one output row:
+
+* ``row``: position in the input. Rows are written in completion order.
+* ``id``: the input ``id``, when there is one.
+* ``origin`` and ``destination``: node ids; -1 when not snapped (including blank
+  or non-numeric coordinates) or unreachable.
+* ``snap_m``: origin snap distance.
+* ``metres``: route length.
+* ``risk``: sum of ``length * var_mean`` along the route.
+* ``nodes``: the space-separated node sequence.
+
+::
+
+    python -m model.batch_routing households.csv routes.csv --workers 4
+"""
+import argparse
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .graph_store import artifact_dir, load_graph
+from .io import ResultWriter, parse_lonlat
+from .road_graph import DEFAULT_MAP_CSV
+from .routing import ShelterRoutes, tree_accumulate, walk_predecessors
+from .sweep import DEFAULT_SHELTER_SETS
+
+ORIGIN_COLUMNS = ("origin_lon", "origin_lat")
+DESTINATION_COLUMNS = ("destination_lon", "destination_lat")
+
+
+def read_chunks(path, chunksize=10000):
+    """Frames of up to ``chunksize`` rows from a CSV or Parquet (needs pyarrow) file."""
+    import pandas as pd
+
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+class BatchRouter:
+    """Routes for coordinate arrays on one graph, to the nearest of ``shelters`` or to given destinations."""
+
+    def __init__(self, graph, shelters, profile="length", max_snap=200.0, batch_size=32):
+        self.graph = graph
+        self.profile = profile
+        self.max_snap = max_snap
+        self.batch_size = batch_size
+        self._risk = graph.length * graph.var_mean
+        self.routes = ShelterRoutes(graph, shelters, profile)
+        dist, self._next_hop, self._shelter = self.routes.nearest_tree()
+        self._metres = tree_accumulate(graph, self._next_hop, graph.length)
+        self._risks = tree_accumulate(graph, self._next_hop, self._risk)
+
+    def route(self, origin_lon, origin_lat, destination_lon=None, destination_lat=None):
+        """``origin, destination, snap_m, metres, risk, paths`` for each origin (``paths`` is a list).
+
+        Where ``destination_lon`` is None or NaN the destination is the
+        nearest shelter.
+        """
+        graph = self.graph
+        origin, snap_m = graph.snapper.nearest_node(origin_lon, origin_lat, max_distance=self.max_snap)
+        origin = np.atleast_1d(origin)
+        n = len(origin)
+        destination = np.full(n, -1, dtype=np.int64)
+        metres = np.full(n, np.nan)
+        risk = np.full(n, np.nan)
+        paths = [None] * n
+        if destination_lon is None:
+            to_shelter = origin >= 0
+        else:
+            destination_lon = np.atleast_1d(np.asarray(destination_lon, dtype=np.float64))
+            destination_lat = np.atleast_1d(np.asarray(destination_lat, dtype=np.float64))
+            to_shelter = (origin >= 0) & np.isnan(destination_lon)
+            given = (origin >= 0) & ~np.isnan(destination_lon)
+            if given.any():
+                target, _ = graph.snapper.nearest_node(destination_lon[given], destination_lat[given],
+                                                       max_distance=self.max_snap)
+                self._route_to(np.flatnonzero(given), origin, target, destination, metres, risk, paths)
+
+        rows = np.flatnonzero(to_shelter)
+        reachable = rows[self._shelter[origin[rows]] >= 0]
+        destination[reachable] = self._shelter[origin[reachable]]
+        metres[reachable] = self._metres[origin[reachable]]
+        risk[reachable] = self._risks[origin[reachable]]
+        for i in reachable.tolist():
+            paths[i] = walk_predecessors(self._next_hop, origin[i])
+        return origin, destination, np.atleast_1d(snap_m), metres, risk, paths
+
+    def _route_to(self, rows, origin, target, destination, metres, risk, paths):
+        """Fill results for ``rows`` routed to snapped ``target`` nodes, one reverse search per distinct target."""
+        from scipy.sparse.csgraph import dijkstra
+
+        graph = self.graph
+        snapped = target >= 0
+        rows, target = rows[snapped], target[snapped]
+        targets, group = np.unique(target, return_inverse=True)
+        order = np.argsort(group, kind="stable")
+        rows, group = rows[order], group[order]
+        matrix = graph.to_csr_matrix(self.profile, reverse=True)
+        for start in range(0, len(targets), self.batch_size):
+            dist, next_hop = dijkstra(matrix, indices=targets[start:start + self.batch_size], return_predecessors=True)
+            lo, hi = np.searchsorted(group, [start, start + self.batch_size])
+            for row, g in zip(rows[lo:hi].tolist(), (group[lo:hi] - start).tolist()):
+                if not np.isfinite(dist[g, origin[row]]):
+                    continue
+                path = walk_predecessors(next_hop[g], origin[row])
+                edges = graph.edge_ids(path[:-1], path[1:])
+                destination[row] = path[-1]
+                metres[row] = graph.length[edges].sum()
+                risk[row] = self._risk[edges].sum()
+                paths[row] = path
+
+
+# Per-process state of routing workers, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(directory, shelters, profile, max_snap):
+    _worker["router"] = BatchRouter(load_graph(directory), shelters, profile, max_snap)
+
+
+def _route_chunk(first_row, chunk):
+    """Output rows for one input chunk (a dict of column arrays) starting at input row ``first_row``."""
+    has_destination = all(column in chunk for column in DESTINATION_COLUMNS)
+    origin, destination, snap_m, metres, risk, paths = _worker["router"].route(
+        *(chunk[column] for column in ORIGIN_COLUMNS),
+        *((chunk[column] for column in DESTINATION_COLUMNS) if has_destination else ()),
+    )
+    ids = chunk.get("id")
+    rows = []
+    for i in range(len(origin)):
+        row = {"row": first_row + i}
+        if ids is not None:
+            row["id"] = ids[i]
+        row.update(
+            origin=int(origin[i]),
+            destination=int(destination[i]),
+            snap_m=float(snap_m[i]),
+            metres=float(metres[i]),
+            risk=float(risk[i]),
+            nodes=" ".join(map(str, paths[i])) if paths[i] is not None else "",
+        )
+        rows.append(row)
+    return rows
+
+
+def route_file(in_path, out_path, shelters=None, profile="length", workers=None, chunksize=10000,
+               max_snap=200.0, path=DEFAULT_MAP_CSV, progress=None):
+    """Route every row of ``in_path`` on a pool of ``workers`` processes and stream the results to ``out_path``.
+
+    ``shelters`` are ``(lon, lat)`` pairs snapped to their nearest nodes
+    (default: the ``"default"`` set of :data:`.sweep.DEFAULT_SHELTER_SETS`).
+    ``progress`` is an optional callable invoked with the number of rows
+    written so far after every chunk. Returns the number of rows written.
+    """
+    import pandas as pd
+
+    directory = artifact_dir(path)
+    graph = load_graph(directory)
+    lon, lat = np.asarray(DEFAULT_SHELTER_SETS["default"] if shelters is None else shelters,
+                          dtype=np.float64).reshape(-1, 2).T
+    snapped = np.unique(graph.snapper.nearest_node(lon, lat, max_distance=float("inf"))[0])
+    workers = workers or os.cpu_count()
+
+    writer = ResultWriter(out_path, batch_size=chunksize)
+    written = 0
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(directory, snapped, profile, max_snap)) as pool:
+            pending = set()
+            first_row = 0
+            chunks = read_chunks(in_path, chunksize)
+            while True:
+                # Keep the pool busy without reading ahead of it
+                for chunk in chunks:
+                    missing = [c for c in ORIGIN_COLUMNS if c not in chunk]
+                    if missing:
+                        raise ValueError(f"Missing input columns: {missing!r}")
+                    # Blank or malformed coordinates become NaN, which snaps to nothing (origin -1)
+                    data = {c: pd.to_numeric(chunk[c], errors="coerce").to_numpy(np.float64)
+                            for c in ORIGIN_COLUMNS + DESTINATION_COLUMNS if c in chunk}
+                    if "id" in chunk:
+                        data["id"] = chunk["id"].tolist()
+                    pending.add(pool.submit(_route_chunk, first_row, data))
+                    first_row += len(chunk)
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rows = future.result()
+                    for row in rows:
+                        writer.write(row)
+                    written += len(rows)
+                    if progress is not None:
+                        progress(written)
+    finally:
+        writer.close()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Route a table of origins to shelters or destinations.")
+    parser.add_argument("input", help="origins file (.csv, or .parquet with pyarrow installed)")
+    parser.add_argument("out", help="routes file (.csv, or .parquet with pyarrow installed)")
+    parser.add_argument("--shelters", nargs="+", type=parse_lonlat, metavar="LON,LAT",
+                        help="shelter coordinates for rows without a destination")
+    parser.add_argument("--profile", default="length", choices=["length", "risk"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunksize", type=int, default=10000)
+    parser.add_argument("--max-snap", type=float, default=200.0, help="metres an origin may be from the network")
+    args = parser.parse_args(argv)
+
+    done = route_file(args.input, args.out, shelters=args.shelters, profile=args.profile, workers=args.workers,
+                      chunksize=args.chunksize, max_snap=args.max_snap,
+                      progress=lambda n: print(f"{n} routes written", end="\r"))
+    print(f"Wrote {done} routes to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
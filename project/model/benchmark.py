@@ -0,0 +1,224 @@
+"""Timings of every pipeline stage on the real map and on synthetic networks.
+
+Stages, in pipeline order (see ``STAGES``):
+
+* ``csv_load``: read the road CSV and parse its WKT column.
+* ``graph_build``: ``build_road_graph`` without gap bridging.
+* ``knn_bridging``: the k-nearest-neighbour gap bridges alone.
+* ``snap_index`` / ``snap_query``: build a ``Snapper``, snap random points to edges.
+* ``single_query``: point-to-point ``shortest_path`` between random nodes.
+* ``batch_routing``: nearest-shelter tree plus a route for many origins.
+* ``spatial_join``: index flood points and join them onto the roads.
+* ``render``: draw the ``MapView`` once and blit a route over it.
+
+``real`` runs on ``preprocessed_Map.csv`` (with the AEGIS points joined onto
+``flood_roads_with_coords.csv``); ``grid`` and ``radial`` run on networks from
+:mod:`.synthetic` with about ``--sizes`` directed edges each and random
+hazard. Each stage reports the best of ``--repeat`` runs and how many
+operations (queries, points, routes) it covered. Results are appended to the
+output file as JSON lines, one per network and stage, tagged with the commit,
+time and library versions so runs can be compared across changes::
+
+    python -m model.benchmark bench.jsonl --sizes 100 1000 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from .road_graph import DEFAULT_MAP_CSV, _knn_bridges, build_road_graph
+
+DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data"))
+ROADS_WITH_COORDS_CSV = os.path.join(DATA_DIR, "flood_roads_with_coords.csv")
+AEGIS_CSV = os.path.join(DATA_DIR, "AEGISDataset.csv")
+
+STAGES = (
+    "csv_load", "graph_build", "knn_bridging", "snap_index", "snap_query",
+    "single_query", "batch_routing", "spatial_join", "render",
+)
+NETWORKS = ("real", "grid", "radial")
+
+
+def _best(fn, repeat):
+    """``(seconds, result)`` of the fastest of ``repeat`` calls to ``fn``."""
+    best, result = np.inf, None
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _environment():
+    """Commit, time and versions recorded with every result."""
+    import pandas as pd
+    import scipy
+    import shapely
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "pandas": pd.__version__,
+        "shapely": shapely.__version__,
+        "cpus": os.cpu_count(),
+    }
+
+
+def _network(network, n_edges, seed):
+    """``(roads csv, hazard points frame, roads frame for the join)`` of a network; writes synthetic CSVs to a temp file."""
+    import pandas as pd
+
+    from .synthetic import grid_network, hazard_points, radial_network
+
+    if network == "real":
+        return DEFAULT_MAP_CSV, pd.read_csv(AEGIS_CSV), pd.read_csv(ROADS_WITH_COORDS_CSV)
+    if network == "grid":
+        roads = grid_network(n_edges, seed=seed)
+    elif network == "radial":
+        roads = radial_network(n_edges, seed=seed)
+    else:
+        raise ValueError(f"Unknown network: {network!r}")
+    handle, path = tempfile.mkstemp(suffix=".csv", prefix=f"bench_{network}_")
+    os.close(handle)
+    roads.to_csv(path, index=False)
+    return path, hazard_points(roads, max(len(roads), 1000), seed=seed), roads
+
+
+def run_benchmark(network, n_edges=None, stages=STAGES, repeat=3, queries=100, points=10000, seed=0):
+    """Time ``stages`` on one network; yields a result dict per stage.
+
+    ``n_edges`` sizes the synthetic networks and is ignored for ``"real"``.
+    """
+    import pandas as pd
+    import shapely
+
+    from .hazard import HazardIndex, join_nearest
+    from .routing import ShelterRoutes, shortest_path
+    from .snapping import Snapper
+
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)!r}")
+    rng = np.random.default_rng(seed)
+    csv_path, flood_points, join_roads = _network(network, n_edges, seed)
+    try:
+        def load():
+            df = pd.read_csv(csv_path)
+            shapely.from_wkt(df["WKT"].to_numpy())
+            return df
+
+        seconds, df = _best(load, repeat)
+        graph = build_road_graph(df, k=0)
+        base = {"network": network, "size": n_edges, "roads": len(df)}
+
+        def record(stage, seconds, ops=1):
+            return dict(base, stage=stage, nodes=graph.n_nodes, edges=graph.n_edges, seconds=seconds, ops=ops)
+
+        if "csv_load" in stages:
+            yield record("csv_load", seconds, len(df))
+        if "graph_build" in stages:
+            seconds, graph = _best(lambda: build_road_graph(df, k=0), repeat)
+            yield record("graph_build", seconds, graph.n_edges)
+        if "knn_bridging" in stages:
+            node_xy = np.column_stack([graph.lon, graph.lat])
+            seconds, _ = _best(lambda: _knn_bridges(node_xy, graph.sources, graph.targets, 4), repeat)
+            yield record("knn_bridging", seconds, graph.n_nodes)
+        # Later stages run on the graph the application uses, gaps bridged
+        graph = build_road_graph(df)
+
+        lon = rng.uniform(graph.lon.min(), graph.lon.max(), points)
+        lat = rng.uniform(graph.lat.min(), graph.lat.max(), points)
+        seconds, snapper = _best(lambda: Snapper(graph), repeat if "snap_index" in stages else 1)
+        if "snap_index" in stages:
+            yield record("snap_index", seconds, graph.n_edges)
+        if "snap_query" in stages:
+            seconds, _ = _best(lambda: snapper.nearest_edge(lon, lat, max_distance=np.inf), repeat)
+            yield record("snap_query", seconds, points)
+
+        pairs = rng.integers(graph.n_nodes, size=(queries, 2))
+        if "single_query" in stages:
+            seconds, _ = _best(lambda: [shortest_path(graph, s, t) for s, t in pairs.tolist()], repeat)
+            yield record("single_query", seconds, queries)
+        if "batch_routing" in stages:
+            shelters = rng.choice(graph.n_nodes, size=min(2, graph.n_nodes), replace=False)
+            origins = rng.integers(graph.n_nodes, size=min(points, 1000))
+
+            def batch():
+                routes = ShelterRoutes(graph, shelters)
+                return [routes.route_to_nearest(o) for o in origins.tolist()]
+
+            seconds, _ = _best(batch, repeat)
+            yield record("batch_routing", seconds, len(origins))
+        if "spatial_join" in stages:
+            seconds, _ = _best(lambda: join_nearest(join_roads, HazardIndex(flood_points)), repeat)
+            yield record("spatial_join", seconds, len(join_roads))
+        if "render" in stages:
+            yield record("render", _render(graph, pairs[0], repeat))
+    finally:
+        if network != "real":
+            os.remove(csv_path)
+
+
+def _render(graph, pair, repeat):
+    """Seconds to draw the map once and blit a route over it (Agg backend)."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    from .map_view import MapView
+    from .routing import shortest_path
+
+    path = shortest_path(graph, *pair.tolist()) or pair.tolist()
+
+    def render():
+        view = MapView(graph)
+        view.canvas.draw()
+        view.line("path", *graph.coords(path), color="blue", linewidth=3, label="Path", zorder=4)
+        view.update()
+        plt.close(view.fig)
+
+    return _best(render, repeat)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the routing pipeline on real and synthetic road networks.")
+    parser.add_argument("out", help="JSON lines file the results are appended to")
+    parser.add_argument("--networks", nargs="+", default=list(NETWORKS), choices=NETWORKS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 10000, 100000],
+                        help="approximate directed edges of each synthetic network")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is reported")
+    parser.add_argument("--queries", type=int, default=100, help="point-to-point queries per run")
+    parser.add_argument("--points", type=int, default=10000, help="points snapped per run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    environment = _environment()
+    runs = [(network, None) if network == "real" else (network, size)
+            for network in args.networks for size in ([None] if network == "real" else args.sizes)]
+    with open(args.out, "a") as out:
+        for network, size in runs:
+            for result in run_benchmark(network, size, args.stages, args.repeat, args.queries, args.points, args.seed):
+                out.write(json.dumps(dict(environment, **result)) + "\n")
+                out.flush()
+                print(f"{network:>6} {result['edges']:>8} edges  {result['stage']:<14} {result['seconds']:.4f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Shelter catchments and evacuation isochrones.
+
+One multi-source reverse Dijkstra from every shelter gives, for every node,
+the cost to its nearest shelter, which shelter that is and the next hop
+towards it. Isochrone bands and catchment maps are read straight off those
+arrays. Adding a shelter runs one search from the new shelter and keeps the
+nodes it serves better. Removing one re-runs the search only over the nodes
+that shelter served, seeded from the neighbouring catchments.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+CatchmentGrid = namedtuple("CatchmentGrid", ["lon0", "lat0", "dlon", "dlat", "cost", "shelter"])
+CatchmentGrid.__doc__ = """Catchment raster: cell ``[row, col]`` is centred on ``(lon0 + col * dlon, lat0 + row * dlat)``.
+
+``cost`` is NaN and ``shelter`` -1 for cells off the network or with no reachable shelter."""
+
+
+class Catchments:
+    """Nearest-shelter cost, assignment and next hop for every node of ``graph``.
+
+    ``cost[v]`` is the cost from ``v`` to its shelter under ``profile``,
+    ``shelter[v]`` that shelter's node id and ``next_hop[v]`` the next node on
+    the way. Unreachable nodes have ``inf``, -1 and a negative next hop.
+    """
+
+    def __init__(self, graph, shelters, profile="length"):
+        from scipy.sparse.csgraph import dijkstra
+
+        self.graph = graph
+        self.profile = profile
+        self.shelters = sorted({int(s) for s in np.atleast_1d(shelters)})
+        self._matrix = graph.to_csr_matrix(profile, reverse=True)
+        if self.shelters:
+            self.cost, self.next_hop, self.shelter = dijkstra(
+                self._matrix, indices=self.shelters, min_only=True, return_predecessors=True
+            )
+        else:
+            self.cost = np.full(graph.n_nodes, np.inf)
+            self.next_hop = np.full(graph.n_nodes, -9999, dtype=np.int32)
+            self.shelter = np.full(graph.n_nodes, -1, dtype=np.int32)
+        self.shelter[~np.isfinite(self.cost)] = -1
+
+    def bands(self, thresholds):
+        """Isochrone band of every node: ``i`` when cost falls in ``[thresholds[i - 1], thresholds[i])``.
+
+        Nodes at or beyond the last threshold get ``len(thresholds)``,
+        unreachable nodes -1.
+        """
+        band = np.searchsorted(np.asarray(thresholds, dtype=np.float64), self.cost, side="right")
+        return np.where(np.isfinite(self.cost), band, -1)
+
+    def sizes(self):
+        """``{shelter node: number of nodes it serves}``."""
+        served = np.bincount(self.shelter[self.shelter >= 0], minlength=self.graph.n_nodes)
+        return {s: int(served[s]) for s in self.shelters}
+
+    def add_shelter(self, node):
+        """Open a shelter at ``node`` and reassign the nodes it serves better. Returns how many changed."""
+        from scipy.sparse.csgraph import dijkstra
+
+        node = int(node)
+        if node in self.shelters:
+            return 0
+        self.shelters = sorted(self.shelters + [node])
+        finite = self.cost[np.isfinite(self.cost)]
+        # Nothing further than the current worst cost can improve, except unreachable nodes
+        limit = finite.max() if len(finite) == self.graph.n_nodes else np.inf
+        cost, next_hop = dijkstra(self._matrix, indices=node, return_predecessors=True, limit=limit)
+        better = cost < self.cost
+        self.cost[better] = cost[better]
+        self.next_hop[better] = next_hop[better]
+        self.shelter[better] = node
+        return int(better.sum())
+
+    def remove_shelter(self, node):
+        """Close the shelter at ``node`` and reassign the nodes it served. Returns how many changed."""
+        from scipy.sparse import csr_matrix, hstack, vstack
+        from scipy.sparse.csgraph import dijkstra
+
+        node = int(node)
+        if node not in self.shelters:
+            raise ValueError(f"Unknown shelter: {node!r}")
+        self.shelters.remove(node)
+        region = np.flatnonzero(self.shelter == node)
+        self.cost[region] = np.inf
+        self.shelter[region] = -1
+        self.next_hop[region] = -9999
+        if not self.shelters:
+            return len(region)
+
+        # Seed every region node with its best edge straight into another catchment
+        graph = self.graph
+        weights = graph.edge_weights(self.profile)
+        counts = graph.offsets[region + 1] - graph.offsets[region]
+        out = np.repeat(np.arange(len(region)), counts)
+        edges = np.repeat(graph.offsets[region], counts) + np.arange(len(out)) - np.repeat(np.cumsum(counts) - counts, counts)
+        through = weights[edges] + self.cost[graph.targets[edges]]
+        seed = np.full(len(region), np.inf)
+        np.minimum.at(seed, out, through)
+        best = np.full(len(region), -1, dtype=np.int64)
+        hit = np.isfinite(through) & (through == seed[out])
+        best[out[hit]] = graph.targets[edges[hit]]
+
+        # One search over the region from a virtual source (index 0) linked to every seeded node
+        sub = self._matrix[region][:, region]
+        seeded = np.flatnonzero(np.isfinite(seed))
+        # Stored zeros stay edges for csgraph, so a zero-cost seed (a region node with a zero-weight
+        # edge into another catchment) needs no special case
+        link = csr_matrix((seed[seeded], (np.zeros(len(seeded), dtype=np.int64), seeded)), shape=(1, len(region)))
+        matrix = vstack([hstack([csr_matrix((1, 1)), link]), hstack([csr_matrix((len(region), 1)), sub])]).tocsr()
+        cost, pred = dijkstra(matrix, indices=0, return_predecessors=True)
+        cost, pred = cost[1:], pred[1:]
+        reached = np.isfinite(cost)
+        from_source = reached & (pred == 0)
+        inside = reached & (pred > 0)
+        self.cost[region[reached]] = np.where(from_source, seed, cost)[reached]
+        self.next_hop[region[from_source]] = best[from_source]
+        self.next_hop[region[inside]] = region[pred[inside] - 1]
+        # Shelters are inherited along next hops, by pointer doubling towards the other catchments
+        hop = self.next_hop.astype(np.int64)
+        nodes = region[reached]
+        while len(nodes := nodes[self.shelter[nodes] < 0]):
+            self.shelter[nodes] = self.shelter[hop[nodes]]
+            hop[nodes] = hop[hop[nodes]]
+        return len(region)
+
+    def at(self, lon, lat, max_distance=None):
+        """``(cost, shelter)`` at arbitrary points, entering the network at the nearest road.
+
+        The cost includes the part of the road between the point's projection
+        and the node it continues through. Points further than ``max_distance``
+        metres from a road get NaN and -1.
+        """
+        graph = self.graph
+        snap = graph.snapper.nearest_edge(lon, lat, max_distance=max_distance)
+        edge, fraction = np.atleast_1d(snap.edge), np.atleast_1d(snap.fraction)
+        cost = np.full(len(edge), np.nan)
+        shelter = np.full(len(edge), -1, dtype=np.int64)
+        found = edge >= 0
+        e, f = edge[found], fraction[found]
+        u, v = graph.sources[e], graph.targets[e]
+        weights = graph.edge_weights(self.profile)
+        # A point at the far end of a closed road (weight inf) is at the node, not inf * 0 = NaN away
+        forward = np.multiply(1 - f, weights[e], out=np.zeros(len(e)), where=f < 1) + self.cost[v]
+        reverse_edge = graph.edge_ids(v, u)
+        partial = np.multiply(f, weights[np.maximum(reverse_edge, 0)], out=np.zeros(len(e)), where=f > 0)
+        backward = np.where(reverse_edge >= 0, partial + self.cost[u], np.inf)
+        via = np.where(forward <= backward, v, u)
+        best = np.minimum(forward, backward)
+        reachable = np.isfinite(best)
+        rows = np.flatnonzero(found)[reachable]
+        cost[rows] = best[reachable]
+        shelter[rows] = self.shelter[via[reachable]]
+        return cost, shelter
+
+    def rasterize(self, cell=25.0, bounds=None, max_distance=None):
+        """:data:`CatchmentGrid` of cost and shelter on ``cell``-metre cells over ``bounds`` (default: the graph)."""
+        from .distance import EARTH_RADIUS_M
+
+        graph = self.graph
+        if bounds is None:
+            bounds = (graph.lon.min(), graph.lat.min(), graph.lon.max(), graph.lat.max())
+        min_lon, min_lat, max_lon, max_lat = bounds
+        dlat = np.degrees(cell / EARTH_RADIUS_M)
+        dlon = dlat / np.cos(np.radians((min_lat + max_lat) / 2))
+        lon = min_lon + dlon * np.arange(int(np.ceil((max_lon - min_lon) / dlon)) + 1)
+        lat = min_lat + dlat * np.arange(int(np.ceil((max_lat - min_lat) / dlat)) + 1)
+        grid_lon, grid_lat = np.meshgrid(lon, lat)
+        cost, shelter = self.at(grid_lon.ravel(), grid_lat.ravel(), cell if max_distance is None else max_distance)
+        return CatchmentGrid(min_lon, min_lat, dlon, dlat, cost.reshape(grid_lon.shape), shelter.reshape(grid_lon.shape))
@@ -0,0 +1,334 @@
+"""Customizable contraction hierarchy (CCH) over the road graph.
+
+Preprocessing is split in two, so flood-risk weights can change without
+contracting the network again:
+
+1. :meth:`ContractionHierarchy.build` depends only on the road topology. It
+   orders the nodes by geometric nested dissection (recursive median cuts with
+   the cut's endpoints ranked above both halves), eliminates them in that order
+   and records the resulting upward arcs, the elimination tree and every lower
+   triangle. The result is saved with the graph artifact.
+2. :meth:`ContractionHierarchy.customize` takes any per-edge weights (e.g.
+   ``graph.edge_weights("risk")`` after a hazard update) and computes the arc
+   weights by relaxing the lower triangles bottom-up, one elimination-tree
+   level at a time as vectorized NumPy.
+
+In a CCH the upward search space of a node is exactly its path to the root of
+the elimination tree, so a query scans two such paths without a priority
+queue. Arcs remember the middle node of their best triangle, which unpacks
+them into original edges.
+"""
+import numpy as np
+
+from .graph_store import load_arrays, save_arrays
+
+HIERARCHY_ARRAYS = (
+    "rank", "parent", "depth", "up_offsets", "up_heads",
+    "tri_lower", "tri_upper", "tri_top", "level_offsets",
+)
+
+HIERARCHY_PREFIX = "ch_"
+
+
+def nested_dissection_order(graph, leaf_size=32):
+    """Node ids in elimination order (least important first) by geometric nested dissection."""
+    x = graph.lon * np.cos(np.radians(graph.lat.mean())) if graph.n_nodes else graph.lon
+    y = graph.lat
+    src, dst = graph.sources.astype(np.int64), graph.targets.astype(np.int64)
+    keep = src < dst
+    src, dst = np.concatenate([src[keep], dst[~keep]]), np.concatenate([dst[keep], src[~keep]])
+
+    order = []
+    # Entries are (kind, nodes, edges among them); a separator is pushed below its
+    # halves, so it is emitted after everything inside them
+    stack = [("part", np.arange(graph.n_nodes), np.arange(len(src)))]
+    while stack:
+        kind, nodes, edges = stack.pop()
+        if kind == "separator" or len(nodes) <= leaf_size:
+            order.append(nodes)
+            continue
+        coord = x if np.ptp(x[nodes]) >= np.ptp(y[nodes]) else y
+        left = np.zeros(graph.n_nodes, dtype=bool)
+        left[nodes[coord[nodes] <= np.median(coord[nodes])]] = True
+        cut = left[src[edges]] != left[dst[edges]]
+        ends = np.where(left[src[edges[cut]]], src[edges[cut]], dst[edges[cut]])
+        separator = np.unique(ends)
+        in_separator = np.zeros(graph.n_nodes, dtype=bool)
+        in_separator[separator] = True
+        kept = edges[~cut & ~in_separator[src[edges]] & ~in_separator[dst[edges]]]
+        halves = []
+        for side in (True, False):
+            part = nodes[(left[nodes] == side) & ~in_separator[nodes]]
+            if len(part):
+                halves.append(("part", part, kept[left[src[kept]] == side]))
+        if len(halves) == 1 and not len(separator):
+            order.append(nodes)  # no cut possible (e.g. identical coordinates)
+            continue
+        stack.append(("separator", separator, None))
+        stack.extend(halves)
+    return np.concatenate(order) if order else np.empty(0, dtype=np.int64)
+
+
+class ContractionHierarchy:
+    """Metric-independent contraction of a RoadGraph plus the current customized arc weights.
+
+    Arcs join a node to a higher-ranked node (its "head"); ``fwd`` is the cost
+    of travelling up an arc and ``bwd`` the cost of travelling down it.
+    """
+
+    def __init__(self, graph, rank, parent, depth, up_offsets, up_heads, tri_lower, tri_upper, tri_top,
+                 level_offsets):
+        self.graph = graph
+        self.rank = rank
+        self.parent = parent
+        self.depth = depth
+        self.up_offsets = up_offsets
+        self.up_heads = up_heads
+        self.tri_lower, self.tri_upper, self.tri_top = tri_lower, tri_upper, tri_top
+        self.level_offsets = level_offsets
+        n = graph.n_nodes
+        self._tails = np.repeat(np.arange(n, dtype=np.int64), np.diff(up_offsets))
+        self._keys = self._tails * n + up_heads
+        self.fwd = self.bwd = None
+        self.settled = 0
+
+    @classmethod
+    def build(cls, graph, order=None):
+        """Contract ``graph`` in ``order`` (default :func:`nested_dissection_order`); call :meth:`customize` next."""
+        n = graph.n_nodes
+        order = nested_dissection_order(graph) if order is None else np.asarray(order, dtype=np.int64)
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n)
+
+        # Symbolic elimination: a node's upward neighbours become neighbours of its
+        # lowest upward neighbour (its elimination-tree parent), which is enough to
+        # produce every fill-in arc of the chordal supergraph
+        up = [set() for _ in range(n)]
+        for u, v in zip(graph.sources.tolist(), graph.targets.tolist()):
+            if rank[u] < rank[v]:
+                up[u].add(v)
+            else:
+                up[v].add(u)
+        parent = np.full(n, -1, dtype=np.int64)
+        for v in order.tolist():
+            if up[v]:
+                p = min(up[v], key=rank.__getitem__)
+                parent[v] = p
+                up[p].update(up[v])
+                up[p].discard(p)
+
+        sizes = np.array([len(s) for s in up], dtype=np.int64)
+        up_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(sizes, out=up_offsets[1:])
+        up_heads = np.fromiter((w for s in up for w in sorted(s)), dtype=np.int64, count=int(up_offsets[-1]))
+
+        depth = np.zeros(n, dtype=np.int64)
+        for v in order[::-1].tolist():
+            if parent[v] >= 0:
+                depth[v] = depth[parent[v]] + 1
+        height = np.zeros(n, dtype=np.int64)
+        for v in order.tolist():
+            if parent[v] >= 0:
+                height[parent[v]] = max(height[parent[v]], height[v] + 1)
+
+        # Lower triangles {u, v, w} with u lowest and rank v < rank w, stored as their
+        # arcs (u, v), (u, w), (v, w) and grouped by the height of u
+        keys = np.repeat(np.arange(n, dtype=np.int64), sizes) * n + up_heads
+        dtype = np.int32 if len(up_heads) < 2 ** 31 else np.int64
+        per_node = sizes * (sizes - 1) // 2
+        level_offsets = np.zeros(height.max() + 2 if n else 1, dtype=np.int64)
+        np.cumsum(np.bincount(height, weights=per_node, minlength=len(level_offsets) - 1).astype(np.int64),
+                  out=level_offsets[1:])
+        lower, upper, top = (np.empty(level_offsets[-1], dtype=dtype) for _ in range(3))
+        pos = 0
+        by_height = np.argsort(height, kind="stable")
+        for u in by_height[per_node[by_height] > 0].tolist():
+            start, stop = up_offsets[u], up_offsets[u + 1]
+            heads = up_heads[start:stop]
+            by_rank = np.argsort(rank[heads])
+            i, j = np.triu_indices(len(heads), k=1)
+            a, b = by_rank[i], by_rank[j]
+            end = pos + len(a)
+            lower[pos:end] = start + a
+            upper[pos:end] = start + b
+            top[pos:end] = np.searchsorted(keys, heads[a] * n + heads[b])
+            pos = end
+
+        return cls(graph, rank, parent, depth, up_offsets, up_heads, lower, upper, top, level_offsets)
+
+    def save(self, directory):
+        """Store the metric-independent part in an artifact directory as ``ch_*.npy``."""
+        save_arrays(directory, {name: getattr(self, name) for name in HIERARCHY_ARRAYS}, prefix=HIERARCHY_PREFIX)
+
+    @classmethod
+    def load(cls, graph, directory, mmap=True):
+        """Hierarchy saved in ``directory`` for ``graph``, or None if there is none."""
+        arrays = load_arrays(directory, HIERARCHY_ARRAYS, prefix=HIERARCHY_PREFIX, mmap=mmap)
+        return None if arrays is None else cls(graph, **arrays)
+
+    def arc_ids(self, tail, head):
+        """Arc id between ``tail`` and its higher-ranked neighbour ``head`` (vectorized)."""
+        return np.searchsorted(self._keys, np.asarray(tail, dtype=np.int64) * self.graph.n_nodes + head)
+
+    def customize(self, weights=None, profile="length"):
+        """Compute arc weights for per-edge ``weights`` (default ``graph.edge_weights(profile)``)."""
+        graph = self.graph
+        weights = graph.edge_weights(profile) if weights is None else np.asarray(weights, dtype=np.float64)
+        src, dst = graph.sources.astype(np.int64), graph.targets.astype(np.int64)
+        upward = self.rank[src] < self.rank[dst]
+        arcs = self.arc_ids(np.where(upward, src, dst), np.where(upward, dst, src))
+        fwd = np.full(len(self.up_heads), np.inf)
+        bwd = np.full(len(self.up_heads), np.inf)
+        np.minimum.at(fwd, arcs[upward], weights[upward])
+        np.minimum.at(bwd, arcs[~upward], weights[~upward])
+        fwd_mid = np.full(len(fwd), -1, dtype=np.int64)
+        bwd_mid = np.full(len(bwd), -1, dtype=np.int64)
+
+        # Triangles of one level only read arcs finished at lower levels
+        for start, stop in zip(self.level_offsets[:-1], self.level_offsets[1:]):
+            if start == stop:
+                continue
+            lower, upper = self.tri_lower[start:stop], self.tri_upper[start:stop]
+            top, bottom = self.tri_top[start:stop], self._tails[lower]
+            for out, mid, via in ((fwd, fwd_mid, bwd[lower] + fwd[upper]), (bwd, bwd_mid, bwd[upper] + fwd[lower])):
+                np.minimum.at(out, top, via)
+                hit = np.isfinite(via) & (via == out[top])
+                mid[top[hit]] = bottom[hit]
+
+        self.fwd, self.bwd = fwd, bwd
+        self._fwd_mid, self._bwd_mid = fwd_mid, bwd_mid
+        self._fwd_list, self._bwd_list = fwd.tolist(), bwd.tolist()
+        self._heads_list = self.up_heads.tolist()
+        self._offsets_list = self.up_offsets.tolist()
+        self._parent_list = self.parent.tolist()
+        return self
+
+    def _upward(self, node, costs):
+        """Costs from (``costs=fwd``) or to (``bwd``) ``node`` over its elimination-tree path, with parent arcs."""
+        heads, offsets, parent = self._heads_list, self._offsets_list, self._parent_list
+        dist = {node: 0.0}
+        via = {node: -1}
+        v = node
+        while v >= 0:
+            d = dist.get(v, np.inf)
+            if d < np.inf:
+                for a in range(offsets[v], offsets[v + 1]):
+                    w = heads[a]
+                    nd = d + costs[a]
+                    if nd < dist.get(w, np.inf):
+                        dist[w] = nd
+                        via[w] = a
+            v = parent[v]
+        return dist, via
+
+    def _meet(self, source, target):
+        forward, forward_via = self._upward(source, self._fwd_list)
+        backward, backward_via = self._upward(target, self._bwd_list)
+        self.settled = len(forward) + len(backward)
+        best, meeting = np.inf, -1
+        for v, d in backward.items():
+            total = forward.get(v, np.inf) + d
+            if total < best:
+                best, meeting = total, v
+        return best, meeting, forward_via, backward_via
+
+    def distance(self, source, target):
+        """Cost of the shortest route from ``source`` to ``target`` (``inf`` if unreachable)."""
+        return self._meet(int(source), int(target))[0]
+
+    def path(self, source, target):
+        """Node path from ``source`` to ``target`` in the original graph, or None if unreachable."""
+        best, meeting, forward_via, backward_via = self._meet(int(source), int(target))
+        if meeting < 0:
+            return None
+        tails = self._tails
+        # Arcs climbed from the source (travelled up) and from the target (travelled down)
+        up_arcs = []
+        v = meeting
+        while forward_via[v] >= 0:
+            up_arcs.append(forward_via[v])
+            v = int(tails[forward_via[v]])
+        down_arcs = []
+        v = meeting
+        while backward_via[v] >= 0:
+            down_arcs.append(backward_via[v])
+            v = int(tails[backward_via[v]])
+        path = [int(source)]
+        for a in reversed(up_arcs):
+            self._unpack(a, True, path)
+        for a in down_arcs:
+            self._unpack(a, False, path)
+        return path
+
+    def _unpack(self, arc, up, path):
+        """Append the original nodes of ``arc`` (travelled up or down) after its first node to ``path``."""
+        tails, heads = self._tails, self.up_heads
+        stack = [(int(arc), up)]
+        while stack:
+            a, a_up = stack.pop()
+            mid = self._fwd_mid[a] if a_up else self._bwd_mid[a]
+            tail, head = int(tails[a]), int(heads[a])
+            if mid < 0:
+                path.append(head if a_up else tail)
+                continue
+            # tail -> mid -> head goes down (mid, tail) then up (mid, head); reversed for travelling down
+            to_tail, to_head = int(self.arc_ids(mid, tail)), int(self.arc_ids(mid, head))
+            if a_up:
+                stack.extend([(to_head, True), (to_tail, False)])
+            else:
+                stack.extend([(to_tail, True), (to_head, False)])
+
+    def one_to_many(self, source, targets):
+        """Costs from ``source`` to every node in ``targets`` in one sweep (``inf`` where unreachable).
+
+        The search climbs the source's elimination-tree path; the targets'
+        ancestors are then swept top-down, one depth at a time, which costs
+        O(arcs among the selected nodes) however many targets there are.
+        """
+        return self._sweep(int(source), targets, self._fwd_list, self.bwd)
+
+    def many_to_one(self, sources, target):
+        """Costs from every node in ``sources`` to ``target`` (e.g. all households to one shelter)."""
+        return self._sweep(int(target), sources, self._bwd_list, self.fwd)
+
+    def _sweep(self, root, nodes, up_costs, down_costs):
+        nodes = np.atleast_1d(np.asarray(nodes, dtype=np.int64))
+        search, _ = self._upward(root, up_costs)
+        selected = np.zeros(self.graph.n_nodes, dtype=bool)
+        parent = self._parent_list
+        for t in np.unique(nodes).tolist():
+            while t >= 0 and not selected[t]:
+                selected[t] = True
+                t = parent[t]
+        swept = np.flatnonzero(selected)
+        swept = swept[np.argsort(self.depth[swept], kind="stable")]
+        dist = np.full(self.graph.n_nodes, np.inf)
+        dist[list(search)] = list(search.values())
+        # Arc heads are ancestors, so they sit at smaller depths and are final already
+        level_starts = np.flatnonzero(np.diff(self.depth[swept], prepend=-1))
+        for start, stop in zip(level_starts, np.append(level_starts[1:], len(swept))):
+            level = swept[start:stop]
+            counts = self.up_offsets[level + 1] - self.up_offsets[level]
+            level, counts = level[counts > 0], counts[counts > 0]
+            if not len(level):
+                continue
+            first = np.cumsum(counts) - counts
+            arcs = np.repeat(self.up_offsets[level] - first, counts) + np.arange(counts.sum())
+            via = dist[self.up_heads[arcs]] + down_costs[arcs]
+            dist[level] = np.minimum(dist[level], np.minimum.reduceat(via, first))
+        self.settled = len(search) + len(swept)
+        return dist[nodes]
+
+
+def open_hierarchy(graph, profile="length"):
+    """Hierarchy for ``graph`` customized to ``profile``, loaded from its artifact or built (and saved) once.
+
+    The saved part depends only on the topology, so it is reused whatever the
+    graph's current weights; customization always uses them.
+    """
+    ch = ContractionHierarchy.load(graph, graph.artifact_dir) if graph.artifact_dir is not None else None
+    if ch is None:
+        ch = ContractionHierarchy.build(graph)
+        if graph.artifact_dir is not None:
+            ch.save(graph.artifact_dir)
+    return ch.customize(profile=profile)
@@ -1,49 +1,36 @@
+import os
+
+import numpy as np
 import pandas as pd
-import networkx as nx
 import matplotlib.pyplot as plt
-from shapely import wkt
-from geopy.distance import geodesic
-
-# === Load dataset ===
-df = pd.read_csv("../data/final_data/preprocessed_Map.csv")
-df['geometry'] = df['geometry'].apply(wkt.loads)
 
-# === Helper function: Round coordinates ===
-def round_coords(geom, decimals=5):
-    return [(round(x, decimals), round(y, decimals)) for x, y in geom.coords]
+from .graph_store import open_road_graph
 
-# === Initialize graph ===
-G = nx.DiGraph()
+CLEANED_NODES_CSV = os.path.join(os.path.dirname(__file__), "..", "data", "final_data", "cleaned_nodes.csv")
 
 # === Build the graph with real geodesic distances and cleaned nodes ===
-for _, row in df.iterrows():
-    coords = round_coords(row['geometry'])  # rounding to reduce floating point noise
-    for i in range(len(coords) - 1):
-        start = coords[i]
-        end = coords[i + 1]
-
-        if start == end:
-            continue  # skip self-loops
-
-        if not G.has_edge(start, end):
-            distance = geodesic((start[1], start[0]), (end[1], end[0])).meters
-            G.add_edge(start, end, weight=distance)
+# Coordinates are rounded to 5 decimals to reduce floating point noise; no gap bridging.
+# Unlike the old one-way nx.DiGraph (one edge per segment in digitizing order), the
+# RoadGraph holds both directions of every segment. A node is connected either way,
+# so cleaned_nodes.csv lists the same nodes; the segment count below matches the old edge count.
+G = open_road_graph(decimals=5, k=0)
 
 # === Clean up: remove any isolated nodes ===
-isolated_nodes = list(nx.isolates(G))
-G.remove_nodes_from(isolated_nodes)
+degree = np.diff(G.offsets) + np.bincount(G.targets, minlength=G.n_nodes)
+connected = degree > 0
 
 # === Debugging: Print some graph info ===
-print(f"Graph has {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
-print(f"Removed {len(isolated_nodes)} isolated nodes.")
+print(f"Graph has {connected.sum()} nodes and {G.n_edges // 2} road segments ({G.n_edges} directed edges).")
+print(f"Removed {(~connected).sum()} isolated nodes.")
 
 # === Optional: Save node list for inspection ===
-pd.DataFrame(G.nodes()).to_csv("../data/final_data/cleaned_nodes.csv", index=False)
+pd.DataFrame({0: G.lon[connected], 1: G.lat[connected]}).to_csv(CLEANED_NODES_CSV, index=False)
 
 # === Plot the graph ===
-pos = {node: (node[0], node[1]) for node in G.nodes()}
 plt.figure(figsize=(10, 8))
-nx.draw(G, pos, node_size=5, edge_color='gray', with_labels=False)
+for u, v in zip(G.sources, G.targets):
+    plt.plot([G.lon[u], G.lon[v]], [G.lat[u], G.lat[v]], color='gray', zorder=1)
+plt.scatter(G.lon[connected], G.lat[connected], s=5, zorder=2)
 plt.title("Cleaned Road Network")
 plt.xlabel("Longitude")
 plt.ylabel("Latitude")
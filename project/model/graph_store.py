@@ -0,0 +1,130 @@
+"""Prebuilt road graph artifacts.
+
+Building the RoadGraph means parsing WKT and running the KNN gap bridging,
+which needs pandas, shapely and scikit-learn. The finished arrays are written
+once to ``data/final_data/graph_cache/<fingerprint>/`` as ``.npy`` files and
+memory-mapped on later runs, so a headless routing query only imports NumPy.
+The fingerprint covers the input CSV bytes, the build parameters and
+``ARTIFACT_VERSION``; any change to those builds a fresh artifact.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .road_graph import DEFAULT_MAP_CSV, EDGE_COLUMNS, RoadGraph
+
+ARTIFACT_VERSION = 7
+
+DEFAULT_CACHE_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "final_data", "graph_cache"))
+
+GRAPH_ARRAYS = ("lon", "lat", "offsets", "targets") + tuple(EDGE_COLUMNS)
+
+# Snap index arrays, stored as ``snap_<name>.npy``; the KD-trees are rebuilt from them on load
+SNAP_ARRAYS = ("lat0", "half_piece", "node_xy", "segment_edge", "seg_a", "seg_ab", "piece_segment", "piece_xy")
+
+
+def fingerprint(path=DEFAULT_MAP_CSV, **params):
+    """Hex digest identifying an artifact built from ``path`` with ``params``."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(json.dumps({"version": ARTIFACT_VERSION, **params}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def save_graph(graph, directory, meta=None):
+    """Write ``graph`` (arrays, snap index and ``meta.json``) to ``directory`` atomically."""
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        for name in GRAPH_ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(getattr(graph, name)))
+        save_arrays(tmp, graph.snapper.to_arrays(), prefix="snap_")
+        meta = {
+            "version": ARTIFACT_VERSION,
+            "n_nodes": graph.n_nodes,
+            "n_edges": graph.n_edges,
+            **(meta or {}),
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp, directory)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def load_graph(directory, mmap=True):
+    """Load a saved RoadGraph; arrays are memory-mapped read-only when ``mmap``."""
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("version") != ARTIFACT_VERSION:
+        raise ValueError(f"Graph artifact {directory} has version {meta.get('version')}, expected {ARTIFACT_VERSION}")
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None) for name in GRAPH_ARRAYS}
+    graph = RoadGraph(**arrays)
+    graph.meta = meta
+    graph.artifact_dir = directory
+    graph._snapper_dir = directory
+    return graph
+
+
+def load_snapper(directory, mmap=True):
+    """Snapper from the snap index saved with a graph artifact, or None if it has none."""
+    from .snapping import Snapper
+
+    arrays = load_arrays(directory, SNAP_ARRAYS, prefix="snap_", mmap=mmap)
+    return None if arrays is None else Snapper.from_arrays(arrays)
+
+
+def save_arrays(directory, arrays, prefix=""):
+    """Add ``{name: array}`` to an artifact directory as ``<prefix><name>.npy``, each file written atomically."""
+    for name, array in arrays.items():
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".npy")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp, os.path.join(directory, f"{prefix}{name}.npy"))
+
+
+def load_arrays(directory, names, prefix="", mmap=True):
+    """Arrays stored by :func:`save_arrays`, or None if any of them is missing."""
+    paths = {name: os.path.join(directory, f"{prefix}{name}.npy") for name in names}
+    if not all(os.path.isfile(p) for p in paths.values()):
+        return None
+    return {name: np.load(p, mmap_mode="r" if mmap else None) for name, p in paths.items()}
+
+
+def build_artifact(path=DEFAULT_MAP_CSV, decimals=5, k=4, cache_dir=DEFAULT_CACHE_DIR):
+    """Build the road graph from ``path`` and store it; returns the artifact directory."""
+    from .road_graph import load_road_graph
+
+    key = fingerprint(path, decimals=decimals, k=k)
+    directory = os.path.join(cache_dir, key)
+    graph = load_road_graph(path, decimals=decimals, k=k)
+    save_graph(graph, directory, meta={
+        "fingerprint": key,
+        "source": os.path.basename(path),
+        "decimals": decimals,
+        "k": k,
+    })
+    return directory
+
+
+def artifact_dir(path=DEFAULT_MAP_CSV, decimals=5, k=4, cache_dir=DEFAULT_CACHE_DIR):
+    """Directory of the artifact for ``path``, building it first if it does not exist yet."""
+    directory = os.path.join(cache_dir, fingerprint(path, decimals=decimals, k=k))
+    if not os.path.isfile(os.path.join(directory, "meta.json")):
+        build_artifact(path, decimals=decimals, k=k, cache_dir=cache_dir)
+    return directory
+
+
+def open_road_graph(path=DEFAULT_MAP_CSV, decimals=5, k=4, cache_dir=DEFAULT_CACHE_DIR):
+    """Shared RoadGraph for ``path``, built on the first call and memory-mapped afterwards."""
+    return load_graph(artifact_dir(path, decimals=decimals, k=k, cache_dir=cache_dir))
@@ -0,0 +1,289 @@
+"""Attaching AEGIS flood hazard points to road segments.
+
+The AEGIS points are indexed once in a KD-tree over unit vectors on the
+sphere (chord length grows monotonically with great-circle distance, so the
+nearest point by chord is the nearest by haversine) and roads are processed in
+chunks. A join costs O(roads x log points) time, with memory bounded by the
+chunk size rather than a roads x points distance matrix.
+
+:class:`HazardField` interpolates the points continuously instead (inverse
+distance weighting over the same tree), optionally through a precomputed
+:class:`HazardRaster`, and :func:`interpolate_roads` / :func:`interpolate_edges`
+summarise it as min/mean/max along every road or graph edge.
+"""
+import numpy as np
+import pandas as pd
+
+from .distance import EARTH_RADIUS_M, haversine
+
+# AEGISDataset.csv column -> column name in flood_roads_enriched.csv
+HAZARD_COLUMNS = {"flood_heig": "flood_height", "elevation": "elevation", "precipitat": "precipitation"}
+
+
+def _unit_vectors(lon, lat):
+    lon, lat = np.radians(np.asarray(lon, dtype=np.float64)), np.radians(np.asarray(lat, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord(metres):
+    """Straight-line distance between unit vectors ``metres`` apart along the sphere."""
+    return 2 * np.sin(min(metres / EARTH_RADIUS_M, np.pi) / 2) * (1 + 1e-12)
+
+
+class HazardIndex:
+    """Nearest-point lookups over the AEGIS flood points (``latitude``/``longitude`` columns)."""
+
+    def __init__(self, points_df):
+        from scipy.spatial import cKDTree
+
+        self.points = points_df.reset_index(drop=True)
+        self.values = self.points[list(HAZARD_COLUMNS)].to_numpy(dtype=np.float64)
+        self.tree = cKDTree(_unit_vectors(self.points["longitude"].to_numpy(), self.points["latitude"].to_numpy()))
+
+    def nearest(self, lon, lat, max_distance=200.0):
+        """``(point index, metres)`` of the nearest flood point; ``-1`` / ``inf`` beyond ``max_distance``."""
+        lon, lat = np.asarray(lon, dtype=np.float64).ravel(), np.asarray(lat, dtype=np.float64).ravel()
+        index = np.full(len(lon), -1, dtype=np.int64)
+        dist = np.full(len(lon), np.inf)
+        valid = np.isfinite(lon) & np.isfinite(lat)
+        if valid.any():
+            chord, i = self.tree.query(
+                _unit_vectors(lon[valid], lat[valid]), k=1, distance_upper_bound=_chord(max_distance), workers=-1
+            )
+            within = np.isfinite(chord)
+            rows = np.flatnonzero(valid)[within]
+            index[rows] = i[within]
+            dist[rows] = 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(chord[within] / 2, 1.0))
+        return index, dist
+
+    def lookup(self, index):
+        """Hazard values for point indices as an ``(n, 3)`` array, NaN where ``index`` is -1."""
+        out = np.full((len(index), len(HAZARD_COLUMNS)), np.nan)
+        found = index >= 0
+        out[found] = self.values[index[found]]
+        return out
+
+
+def sample_lines(wkt, spacing=25.0):
+    """Points every ``spacing`` metres along each WKT linestring, both ends included.
+
+    Returns ``(lon, lat, line)`` arrays where ``line`` is the position of the
+    source geometry in ``wkt``. Missing or empty geometries produce no samples.
+    """
+    import shapely
+
+    geoms = shapely.from_wkt(np.asarray(wkt, dtype=object), on_invalid="ignore")
+    xy, line = shapely.get_coordinates(geoms, return_index=True)
+    if not len(xy):
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+    same_line = line[1:] == line[:-1]
+    seg_length = np.where(same_line, haversine(xy[:-1, 0], xy[:-1, 1], xy[1:, 0], xy[1:, 1]), 0.0)
+    cum = np.concatenate([[0.0], np.cumsum(seg_length)])
+
+    lines, first = np.unique(line, return_index=True)
+    last = np.append(first[1:], len(line)) - 1
+    length = cum[last] - cum[first]
+    n_samples = np.ceil(length / spacing).astype(np.int64) + 1
+    sample_line = np.repeat(np.arange(len(lines)), n_samples)
+    k = np.arange(len(sample_line)) - np.repeat(np.cumsum(n_samples) - n_samples, n_samples)
+    position = cum[first][sample_line] + length[sample_line] * k / np.maximum(n_samples[sample_line] - 1, 1)
+
+    # Vertex that starts the segment holding each sample, kept inside its own line
+    j = np.searchsorted(cum, position, side="right") - 1
+    j = np.clip(j, first[sample_line], np.maximum(last[sample_line] - 1, first[sample_line]))
+    nxt = np.minimum(j + 1, last[sample_line])
+    seg = np.where(nxt > j, cum[nxt] - cum[j], 0.0)
+    t = np.where(seg > 0, (position - cum[j]) / np.where(seg > 0, seg, 1.0), 0.0)
+    points = xy[j] + np.clip(t, 0.0, 1.0)[:, None] * (xy[nxt] - xy[j])
+    return points[:, 0], points[:, 1], lines[sample_line]
+
+
+def join_nearest(roads, index, max_distance=200.0, along="first", spacing=25.0):
+    """Hazard of the nearest flood point within ``max_distance`` metres of each road.
+
+    ``along="first"`` measures from the road's ``longitude``/``latitude``
+    columns (its first vertex, as ``scriptConvertLonLat.py`` writes them);
+    ``along="line"`` samples the whole ``WKT`` linestring every ``spacing``
+    metres and takes the flood point closest to any part of the road.
+    Returns a frame with ``flood_height``, ``elevation`` and ``precipitation``.
+    """
+    if along == "first":
+        point, _ = index.nearest(roads["longitude"].to_numpy(), roads["latitude"].to_numpy(), max_distance)
+    elif along == "line":
+        lon, lat, line = sample_lines(roads["WKT"].to_numpy(), spacing)
+        sample_point, sample_dist = index.nearest(lon, lat, max_distance)
+        order = np.lexsort((sample_dist, line))
+        line, sample_point = line[order], sample_point[order]
+        first = np.ones(len(line), dtype=bool)
+        first[1:] = line[1:] != line[:-1]
+        point = np.full(len(roads), -1, dtype=np.int64)
+        point[line[first]] = sample_point[first]
+    else:
+        raise ValueError(f"Unknown sampling mode: {along!r}")
+    return pd.DataFrame(index.lookup(point), index=roads.index, columns=list(HAZARD_COLUMNS.values()))
+
+
+def join_csv(roads_csv, points_csv, out_csv, max_distance=200.0, along="first", spacing=25.0, chunksize=10000):
+    """Stream ``roads_csv`` in chunks, append the joined hazard columns and write ``out_csv``.
+
+    The output has the road columns followed by ``flood_height``, ``elevation``
+    and ``precipitation``, the layout of ``flood_roads_enriched.csv``.
+    Returns the number of roads written.
+    """
+    index = HazardIndex(pd.read_csv(points_csv))
+    written = 0
+    for chunk in pd.read_csv(roads_csv, chunksize=chunksize):
+        hazard = join_nearest(chunk, index, max_distance=max_distance, along=along, spacing=spacing)
+        chunk[list(hazard.columns)] = hazard
+        chunk.to_csv(out_csv, mode="w" if written == 0 else "a", header=written == 0, index=False)
+        written += len(chunk)
+    return written
+
+
+class HazardField(HazardIndex):
+    """Continuous hazard surface: inverse distance weighting of the ``k`` nearest flood points.
+
+    Points further than ``max_distance`` metres do not contribute; where none
+    is in range the field is NaN. A sample on top of a flood point takes that
+    point's values.
+    """
+
+    def __init__(self, points_df, k=8, power=2.0, max_distance=2000.0):
+        super().__init__(points_df)
+        self.k = min(k, len(self.points))
+        self.power = power
+        self.max_distance = max_distance
+
+    def interpolate(self, lon, lat, chunksize=200000):
+        """Interpolated hazard values at the given points as an ``(n, 3)`` array."""
+        lon, lat = np.asarray(lon, dtype=np.float64).ravel(), np.asarray(lat, dtype=np.float64).ravel()
+        out = np.full((len(lon), len(HAZARD_COLUMNS)), np.nan)
+        for start in range(0, len(lon), chunksize):
+            part = slice(start, start + chunksize)
+            chord, i = self.tree.query(
+                _unit_vectors(lon[part], lat[part]), k=self.k, distance_upper_bound=_chord(self.max_distance), workers=-1
+            )
+            chord, i = chord.reshape(len(chord), -1), i.reshape(len(i), -1)
+            found = np.isfinite(chord)
+            metres = 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(np.where(found, chord, 0.0) / 2, 1.0))
+            weight = np.where(found, 1.0 / np.maximum(metres, 1e-6) ** self.power, 0.0)
+            values = self.values[np.where(found, i, 0)]
+            # Missing readings drop out of their column's average instead of voiding it
+            weight = weight[..., None] * np.isfinite(values)
+            with np.errstate(invalid="ignore"):
+                out[part] = (weight * np.nan_to_num(values)).sum(axis=1) / weight.sum(axis=1)
+        return out
+
+    def raster(self, bounds, cell=25.0):
+        """:class:`HazardRaster` of the field over ``(min_lon, min_lat, max_lon, max_lat)`` with ``cell``-metre cells."""
+        min_lon, min_lat, max_lon, max_lat = bounds
+        dlat = np.degrees(cell / EARTH_RADIUS_M)
+        dlon = dlat / np.cos(np.radians((min_lat + max_lat) / 2))
+        lon = min_lon + dlon * np.arange(int(np.ceil((max_lon - min_lon) / dlon)) + 1)
+        lat = min_lat + dlat * np.arange(int(np.ceil((max_lat - min_lat) / dlat)) + 1)
+        grid_lon, grid_lat = np.meshgrid(lon, lat)
+        grid = self.interpolate(grid_lon, grid_lat).reshape(len(lat), len(lon), len(HAZARD_COLUMNS))
+        return HazardRaster(min_lon, min_lat, dlon, dlat, grid)
+
+
+class HazardRaster:
+    """Hazard field precomputed on a regular lon/lat grid, sampled bilinearly.
+
+    ``grid[row, col]`` holds the values at ``(lon0 + col * dlon, lat0 + row *
+    dlat)``. Sampling costs O(1) per point however many flood points built the
+    field; points outside the grid are NaN.
+    """
+
+    def __init__(self, lon0, lat0, dlon, dlat, grid):
+        self.lon0, self.lat0, self.dlon, self.dlat = float(lon0), float(lat0), float(dlon), float(dlat)
+        self.grid = grid
+
+    def interpolate(self, lon, lat):
+        """Hazard values at the given points as an ``(n, 3)`` array."""
+        x = (np.asarray(lon, dtype=np.float64).ravel() - self.lon0) / self.dlon
+        y = (np.asarray(lat, dtype=np.float64).ravel() - self.lat0) / self.dlat
+        rows, cols = self.grid.shape[:2]
+        inside = (x >= 0) & (y >= 0) & (x <= cols - 1) & (y <= rows - 1)
+        out = np.full((len(x), self.grid.shape[2]), np.nan)
+        x, y = x[inside], y[inside]
+        c, r = np.minimum(x.astype(np.int64), max(cols - 2, 0)), np.minimum(y.astype(np.int64), max(rows - 2, 0))
+        c1, r1 = np.minimum(c + 1, cols - 1), np.minimum(r + 1, rows - 1)
+        tx, ty = (x - c)[:, None], (y - r)[:, None]
+        g = self.grid
+        out[inside] = (g[r, c] * (1 - tx) + g[r, c1] * tx) * (1 - ty) + (g[r1, c] * (1 - tx) + g[r1, c1] * tx) * ty
+        return out
+
+    def save(self, path):
+        """Write the grid to an ``.npz`` file."""
+        np.savez(path, origin=[self.lon0, self.lat0, self.dlon, self.dlat], grid=self.grid)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(*data["origin"], data["grid"])
+
+
+def _stats(values, line, n_lines):
+    """Per-line NaN-ignoring min, mean and max of ``(samples, columns)`` values grouped by sorted ``line``."""
+    out = np.full((n_lines, values.shape[1], 3), np.nan)
+    if not len(line):
+        return out
+    starts = np.flatnonzero(np.r_[True, line[1:] != line[:-1]])
+    finite = np.isfinite(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[line[starts], :, 0] = np.fmin.reduceat(values, starts)
+        out[line[starts], :, 1] = np.add.reduceat(np.where(finite, values, 0.0), starts) / np.add.reduceat(finite, starts)
+        out[line[starts], :, 2] = np.fmax.reduceat(values, starts)
+    return out
+
+
+def interpolate_roads(roads, field, spacing=25.0):
+    """Min, mean and max of a :class:`HazardField` (or :class:`HazardRaster`) along each road's ``WKT``.
+
+    The field is sampled every ``spacing`` metres along all roads at once.
+    Returns a frame with ``flood_height_min``, ``flood_height_mean``,
+    ``flood_height_max`` and likewise for ``elevation`` and ``precipitation``.
+    """
+    lon, lat, line = sample_lines(roads["WKT"].to_numpy(), spacing)
+    stats = _stats(field.interpolate(lon, lat), line, len(roads))
+    columns = [f"{name}_{stat}" for name in HAZARD_COLUMNS.values() for stat in ("min", "mean", "max")]
+    return pd.DataFrame(stats.reshape(len(roads), -1), index=roads.index, columns=columns)
+
+
+def interpolate_edges(graph, field, spacing=25.0):
+    """``(n_edges, 3, 3)`` array of hazard min/mean/max along every edge of ``graph``.
+
+    The middle axis follows ``HAZARD_COLUMNS``, the last is min, mean, max.
+    """
+    src, dst = graph.sources, graph.targets
+    length = haversine(graph.lon[src], graph.lat[src], graph.lon[dst], graph.lat[dst])
+    n_samples = np.ceil(length / spacing).astype(np.int64) + 1
+    edge = np.repeat(np.arange(graph.n_edges), n_samples)
+    k = np.arange(len(edge)) - np.repeat(np.cumsum(n_samples) - n_samples, n_samples)
+    t = k / np.maximum(n_samples[edge] - 1, 1)
+    a, b = src[edge], dst[edge]
+    lon = graph.lon[a] + t * (graph.lon[b] - graph.lon[a])
+    lat = graph.lat[a] + t * (graph.lat[b] - graph.lat[a])
+    return _stats(field.interpolate(lon, lat), edge, graph.n_edges)
+
+
+def interpolate_csv(roads_csv, points_csv, out_csv, spacing=25.0, k=8, power=2.0, max_distance=2000.0, cell=None,
+                    chunksize=10000):
+    """Like :func:`join_csv`, but appends the interpolated columns of :func:`interpolate_roads`.
+
+    With ``cell`` (metres) the field is rasterized once over the roads'
+    bounding box and sampled from the grid. Returns the number of roads written.
+    """
+    import shapely
+
+    field = HazardField(pd.read_csv(points_csv), k=k, power=power, max_distance=max_distance)
+    if cell is not None:
+        wkt = pd.read_csv(roads_csv, usecols=["WKT"])["WKT"].to_numpy()
+        field = field.raster(shapely.total_bounds(shapely.from_wkt(wkt, on_invalid="ignore")), cell)
+    written = 0
+    for chunk in pd.read_csv(roads_csv, chunksize=chunksize):
+        hazard = interpolate_roads(chunk, field, spacing)
+        chunk[list(hazard.columns)] = hazard
+        chunk.to_csv(out_csv, mode="w" if written == 0 else "a", header=written == 0, index=False)
+        written += len(chunk)
+    return written
@@ -0,0 +1,58 @@
+"""Result files and command-line values shared by the headless runners.
+
+:class:`ResultWriter` streams result rows to CSV, or to Parquet when the path
+ends in ``.parquet`` (needs pyarrow). :func:`parse_lonlat` reads a
+``LON,LAT`` command-line value.
+"""
+import csv
+
+
+class ResultWriter:
+    """Append result rows to a CSV file, or to a Parquet file in row groups of ``batch_size``."""
+
+    def __init__(self, path, batch_size=64):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self.batch_size = batch_size
+        self._rows = []
+        self._file = None
+        self._writer = None
+
+    def write(self, row):
+        if self.parquet:
+            self._rows.append(row)
+            if len(self._rows) >= self.batch_size:
+                self._flush()
+            return
+        if self._writer is None:
+            self._file = open(self.path, "w", newline="")
+            self._writer = csv.DictWriter(self._file, fieldnames=list(row))
+            self._writer.writeheader()
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table.cast(self._writer.schema))
+        self._rows = []
+
+    def close(self):
+        if self.parquet:
+            self._flush()
+            if self._writer is not None:
+                self._writer.close()
+        elif self._file is not None:
+            self._file.close()
+
+
+def parse_lonlat(value):
+    """``(lon, lat)`` from a ``"LON,LAT"`` string, for argparse ``type=``."""
+    lon, lat = (float(v) for v in value.split(","))
+    return lon, lat
@@ -0,0 +1,91 @@
+"""Landmark distance tables for ALT (A*, landmarks, triangle inequality) search.
+
+For a landmark ``l`` the triangle inequality gives two lower bounds on the
+cost from ``v`` to ``t``: ``d(l, t) - d(l, v)`` and ``d(v, l) - d(t, l)``.
+With a handful of landmarks spread over the edge of the network the largest of
+these bounds is usually close to the true cost, which keeps the search
+focused on the corridor towards the target.
+
+Tables hold the costs under one weight profile as the graph was when they were
+built. They remain valid lower bounds while edge weights only increase (e.g.
+roads being closed); rebuild them after weights decrease. Tables of a graph
+loaded from an artifact are stored in the artifact directory next to the graph
+arrays and memory-mapped on later loads.
+"""
+import numpy as np
+
+from .graph_store import load_arrays, save_arrays
+
+LANDMARK_ARRAYS = ("nodes", "dist_from", "dist_to")
+
+
+class Landmarks:
+    """Landmark node ids plus ``(n_nodes, n_landmarks)`` cost tables.
+
+    ``dist_from[v, i]`` is the cost from landmark ``i`` to ``v`` and
+    ``dist_to[v, i]`` the cost from ``v`` to landmark ``i`` (``inf`` where
+    unreachable).
+    """
+
+    def __init__(self, profile, nodes, dist_from, dist_to):
+        self.profile = profile
+        self.nodes = np.asarray(nodes, dtype=np.int64)
+        self.dist_from = dist_from
+        self.dist_to = dist_to
+
+    @classmethod
+    def build(cls, graph, profile="length", count=16, seed=0):
+        """Pick ``count`` landmarks by farthest-point selection and compute their tables."""
+        from scipy.sparse.csgraph import dijkstra
+
+        forward = graph.to_csr_matrix(profile)
+        rng = np.random.default_rng(seed)
+        # Farthest-point selection: each new landmark is the node farthest from the chosen ones
+        nearest = dijkstra(forward, indices=int(rng.integers(graph.n_nodes)), directed=False)
+        nodes = []
+        for _ in range(min(count, graph.n_nodes)):
+            candidates = np.where(np.isfinite(nearest), nearest, -1.0)
+            candidates[nodes] = -1.0
+            node = int(np.argmax(candidates))
+            nodes.append(node)
+            nearest = np.minimum(nearest, dijkstra(forward, indices=node, directed=False))
+        dist_from = np.ascontiguousarray(dijkstra(forward, indices=nodes).T)
+        dist_to = np.ascontiguousarray(dijkstra(graph.to_csr_matrix(profile, reverse=True), indices=nodes).T)
+        return cls(profile, nodes, dist_from, dist_to)
+
+    def lower_bound(self, nodes, target):
+        """Lower bounds on the cost from each of ``nodes`` to ``target``."""
+        with np.errstate(invalid="ignore"):
+            bound = np.fmax(
+                self.dist_from[target] - self.dist_from[nodes],
+                self.dist_to[nodes] - self.dist_to[target],
+            )
+            bound = np.fmax.reduce(bound, axis=-1)
+        # inf - inf: that landmark says nothing about the pair
+        return np.where(np.isnan(bound), 0.0, np.maximum(bound, 0.0))
+
+    def save(self, directory):
+        """Write the tables to ``directory`` as ``landmarks_<profile>_*.npy``."""
+        save_arrays(directory, {name: getattr(self, name) for name in LANDMARK_ARRAYS}, prefix=f"landmarks_{self.profile}_")
+
+    @classmethod
+    def load(cls, directory, profile="length", mmap=True):
+        """Tables saved in ``directory``, or None if there are none for ``profile``."""
+        arrays = load_arrays(directory, LANDMARK_ARRAYS, prefix=f"landmarks_{profile}_", mmap=mmap)
+        return None if arrays is None else cls(profile, **arrays)
+
+
+def open_landmarks(graph, profile="length", count=16):
+    """Landmarks of ``graph`` for ``profile``, loaded from its artifact or built (and saved there) once.
+
+    Only the unmodified artifact graph (``version`` 0) reads or writes saved tables.
+    """
+    stored = graph.artifact_dir is not None and graph.version == 0
+    if stored:
+        landmarks = Landmarks.load(graph.artifact_dir, profile)
+        if landmarks is not None and len(landmarks.nodes) == min(count, graph.n_nodes):
+            return landmarks
+    landmarks = Landmarks.build(graph, profile, count)
+    if stored:
+        landmarks.save(graph.artifact_dir)
+    return landmarks
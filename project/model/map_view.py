@@ -0,0 +1,141 @@
+"""Interactive matplotlib map of a RoadGraph.
+
+The road network is drawn once as a single ``LineCollection`` (both directions
+of a road share one segment) with the nodes as one hidden scatter, and the
+rendered figure is cached as a background image. Routes, start points and
+shelters are animated layers blitted on top of that image, so a click redraws
+a handful of artists however large the network is. Static changes (toggling
+the nodes, recolouring closed roads) and zoom, pan or resize cost one full
+redraw, after which the background is captured again.
+"""
+import numpy as np
+
+
+class MapView:
+    """Road network on ``ax`` (a new 10x8 figure by default) with named overlay layers.
+
+    Layers are created with :meth:`line` / :meth:`points` and shown by
+    :meth:`update`; the style keywords (passed to ``ax.plot`` /
+    ``ax.scatter``) only apply when a layer is first created, later calls
+    just move it.
+    """
+
+    def __init__(self, graph, ax=None, title=None, edge_color="lightgray", node_color="red"):
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+        from matplotlib.colors import to_rgba_array
+
+        if ax is None:
+            _, ax = plt.subplots(figsize=(10, 8))
+        self.graph = graph
+        self.ax = ax
+        self.fig = ax.figure
+        self.canvas = self.fig.canvas
+        self._blit = self.canvas.supports_blit
+
+        # One segment per road piece; an edge and its reverse map to the same segment
+        src, dst = graph.sources.astype(np.int64), graph.targets.astype(np.int64)
+        reverse = graph.edge_ids(dst, src)
+        first = (reverse < 0) | (src < dst)
+        segment = np.full(graph.n_edges, -1, dtype=np.int64)
+        segment[first] = np.arange(first.sum())
+        segment[~first] = segment[reverse[~first]]
+        self._edge_segment = segment
+        start = np.column_stack([graph.lon[src[first]], graph.lat[src[first]]])
+        end = np.column_stack([graph.lon[dst[first]], graph.lat[dst[first]]])
+        self._edge_colors = np.repeat(to_rgba_array(edge_color), first.sum(), axis=0)
+        self.edges = LineCollection(np.stack([start, end], axis=1), colors=self._edge_colors, zorder=1)
+        ax.add_collection(self.edges)
+        self.nodes = ax.scatter(graph.lon, graph.lat, color=node_color, s=10, zorder=2, visible=False)
+
+        ax.autoscale_view()
+        # Overlays must not move the limits, or the cached background would be stale
+        ax.set_autoscale_on(False)
+        if title:
+            ax.set_title(title)
+        ax.set_xlabel("Longitude")
+        ax.set_ylabel("Latitude")
+        ax.grid(True)
+
+        self._layers = {}
+        self._legend = None
+        self._background = None
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def line(self, name, lon, lat, **style):
+        """Create or move the line layer ``name`` (e.g. a route)."""
+        artist = self._layers.get(name)
+        if artist is None:
+            (artist,) = self.ax.plot(lon, lat, animated=self._blit, **style)
+            self._add(name, artist)
+        else:
+            artist.set_data(lon, lat)
+        return artist
+
+    def points(self, name, lon, lat, **style):
+        """Create or move the point layer ``name`` (e.g. start or shelter markers)."""
+        offsets = np.column_stack([np.atleast_1d(lon), np.atleast_1d(lat)])
+        artist = self._layers.get(name)
+        if artist is None:
+            artist = self.ax.scatter(offsets[:, 0], offsets[:, 1], animated=self._blit, **style)
+            self._add(name, artist)
+        else:
+            artist.set_offsets(offsets)
+        return artist
+
+    def remove(self, name=None):
+        """Remove the layer ``name``, or every layer when ``name`` is None."""
+        names = list(self._layers) if name is None else [name] if name in self._layers else []
+        for n in names:
+            self._layers.pop(n).remove()
+        if names:
+            self._update_legend()
+
+    def show_nodes(self, visible=True):
+        """Show or hide the node scatter (a full redraw)."""
+        self.nodes.set_visible(visible)
+        self.canvas.draw_idle()
+
+    def color_edges(self, edges, color):
+        """Recolour the roads of directed ``edges`` (e.g. closed roads; a full redraw)."""
+        from matplotlib.colors import to_rgba
+
+        self._edge_colors[self._edge_segment[np.asarray(edges, dtype=np.int64)]] = to_rgba(color)
+        self.edges.set_color(self._edge_colors)
+        self.canvas.draw_idle()
+
+    def update(self):
+        """Redraw the overlay layers on top of the cached background."""
+        if not self._blit or self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_layers()
+        self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+
+    def _add(self, name, artist):
+        self._layers[name] = artist
+        self._update_legend()
+
+    def _update_legend(self):
+        handles = [a for a in self._layers.values() if not a.get_label().startswith("_")]
+        if self._legend is not None:
+            self._legend.remove()
+            self._legend = None
+        if handles:
+            # A fixed corner: loc="best" scans every road segment on each redraw
+            self._legend = self.ax.legend(handles=handles, loc="upper right")
+            self._legend.set_animated(self._blit)
+
+    def _draw_layers(self):
+        for artist in sorted(self._layers.values(), key=lambda a: a.get_zorder()):
+            self.ax.draw_artist(artist)
+        if self._legend is not None:
+            self.ax.draw_artist(self._legend)
+
+    def _on_draw(self, event):
+        if not self._blit:
+            return
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_layers()
@@ -0,0 +1,128 @@
+"""Batched, concurrent and disk-cached Overpass API client.
+
+Many way ids are packed into one ``way(id:...)`` query, batches run on a
+bounded thread pool over one pooled ``requests.Session`` (with retries and a
+minimum interval between requests), and every response is stored in
+``project/cache/<sha1 of query>.json`` so re-runs within ``ttl`` are offline.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+
+DEFAULT_CACHE_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "cache"))
+
+
+def way_id(osm_id):
+    """Numeric id of an OSM way given as ``"way/24158513"`` or ``24158513``."""
+    return int(str(osm_id).split("/")[-1])
+
+
+class OverpassFetcher:
+    """Fetch OSM way geometries from an Overpass endpoint.
+
+    ``url`` can point at any Overpass-compatible server (e.g. a local stand-in
+    for tests). ``ttl`` is the cache lifetime in seconds (``None`` never
+    expires), ``batch_size`` the number of way ids per query, ``max_workers``
+    the number of concurrent requests and ``min_interval`` the minimum number
+    of seconds between the start of two requests.
+    """
+
+    def __init__(self, url=OVERPASS_URL, cache_dir=DEFAULT_CACHE_DIR, ttl=7 * 24 * 3600, batch_size=200,
+                 max_workers=4, min_interval=1.0, retries=3, timeout=180):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.url = url
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=2, status_forcelist=(429, 502, 503, 504), allowed_methods=None)
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._rate_lock = threading.Lock()
+        self._next_request = 0.0
+        self.failed = []
+
+    def _cache_path(self, query):
+        return os.path.join(self.cache_dir, hashlib.sha1(query.encode()).hexdigest() + ".json")
+
+    def _read_cache(self, path):
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, path, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _wait_for_slot(self):
+        with self._rate_lock:
+            now = time.monotonic()
+            start = max(now, self._next_request)
+            self._next_request = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+    def query(self, query):
+        """JSON response to an Overpass QL ``query``, from the cache when fresh."""
+        path = self._cache_path(query)
+        data = self._read_cache(path)
+        if data is None:
+            self._wait_for_slot()
+            response = self.session.post(self.url, data={"data": query}, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+            self._write_cache(path, data)
+        return data
+
+    def _ways_query(self, ids):
+        return f"[out:json][timeout:{self.timeout}];way(id:{','.join(map(str, ids))});out geom;"
+
+    def fetch_ways(self, osm_ids, progress=None):
+        """Full geometry of every way in ``osm_ids`` as ``{way id: [(lon, lat), ...]}``.
+
+        Ways missing from the response (deleted, or without geometry) are
+        absent from the result. A batch that still fails after the retries is
+        skipped and its ids are listed in ``failed``; failures are not cached,
+        so a re-run asks for them again. ``progress`` is an optional callable
+        invoked with the number of ways in each finished batch.
+        """
+        ids = sorted({way_id(i) for i in osm_ids})
+        batches = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+        geometries = {}
+        self.failed = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.query, self._ways_query(batch)): batch for batch in batches}
+            for future in as_completed(futures):
+                try:
+                    elements = future.result().get("elements", [])
+                except (OSError, ValueError):
+                    # requests' errors are OSErrors; a bad JSON body is a ValueError
+                    self.failed.extend(futures[future])
+                    elements = []
+                for element in elements:
+                    if element.get("type") == "way" and element.get("geometry"):
+                        geometries[element["id"]] = [(p["lon"], p["lat"]) for p in element["geometry"] if p]
+                if progress is not None:
+                    progress(len(futures[future]))
+        self.failed.sort()
+        return geometries
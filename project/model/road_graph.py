@@ -0,0 +1,325 @@
+import os
+
+import numpy as np
+
+from .distance import vincenty
+
+DEFAULT_MAP_CSV = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "final_data", "preprocessed_Map.csv"))
+
+# Per-edge columns stored alongside the CSR adjacency, with their storage dtype
+EDGE_COLUMNS = {
+    "length": np.float64,          # metres
+    "var_mean": np.float32,        # flood risk from RoadMapWithHazard.csv
+    "var_min": np.float32,         # lowest / highest flood risk reading of the road
+    "var_max": np.float32,
+    "lanes": np.float32,
+    "surface_encoded": np.int16,
+    "highway": np.int8,            # position in HIGHWAY_CLASSES, -1 when unknown
+    "road": np.int32,              # row of preprocessed_Map.csv, -1 for bridging edges
+    "closed": np.bool_,            # road closure; closed edges cost inf under every profile
+}
+
+# Attributes of edges that do not come from a road row (gap bridging); also the
+# default for any column not passed to RoadGraph.from_edges
+BRIDGE_ATTRIBUTES = {
+    "var_mean": 1.0, "var_min": 1.0, "var_max": 1.0, "lanes": 1.0, "surface_encoded": -1, "highway": -1, "road": -1, "closed": False,
+}
+
+# OpenStreetMap ``highway`` values, from the largest roads down; the ``highway`` edge column indexes this
+HIGHWAY_CLASSES = (
+    "motorway", "trunk", "primary", "secondary", "tertiary", "unclassified", "residential", "living_street",
+    "service", "track", "pedestrian", "path", "footway", "cycleway", "steps",
+)
+
+
+class RoadGraph:
+    """Directed road network stored as compressed sparse row (CSR) arrays.
+
+    Nodes are the integers ``0 .. n_nodes - 1`` with coordinates in ``lon`` and
+    ``lat``. The out-edges of node ``u`` are the edge ids
+    ``offsets[u] .. offsets[u + 1] - 1``; ``targets`` and every column in
+    ``EDGE_COLUMNS`` are indexed by that edge id.
+    """
+
+    def __init__(self, lon, lat, offsets, targets, **columns):
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        for name, dtype in EDGE_COLUMNS.items():
+            setattr(self, name, np.asarray(columns[name], dtype=dtype))
+        self._sources = None
+        self._in_edges = None
+        self._matrices = {}
+        self._snapper = None
+        self._snapper_dir = None
+        self.artifact_dir = None  # set by graph_store.load_graph
+        self.meta = {}
+        self.version = 0
+
+    @classmethod
+    def from_edges(cls, lon, lat, src, dst, **columns):
+        """Build the CSR layout from parallel edge arrays, dropping duplicate edges."""
+        n = len(lon)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        order = np.lexsort((dst, src))
+        src, dst = src[order], dst[order]
+        keep = np.ones(len(src), dtype=bool)
+        keep[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        order, src, dst = order[keep], src[keep], dst[keep]
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+        edge_columns = {}
+        for name in EDGE_COLUMNS:
+            value = columns.get(name, BRIDGE_ATTRIBUTES.get(name))
+            edge_columns[name] = np.broadcast_to(value, (len(order),)) if np.ndim(value) == 0 else np.asarray(value)[order]
+        return cls(lon, lat, offsets, dst, **edge_columns)
+
+    @property
+    def n_nodes(self):
+        return len(self.lon)
+
+    @property
+    def n_edges(self):
+        return len(self.targets)
+
+    @property
+    def sources(self):
+        """Source node of every edge (expanded from ``offsets`` on first use)."""
+        if self._sources is None:
+            self._sources = np.repeat(np.arange(self.n_nodes, dtype=np.int32), np.diff(self.offsets))
+        return self._sources
+
+    @property
+    def nbytes(self):
+        arrays = [self.lon, self.lat, self.offsets, self.targets] + [getattr(self, name) for name in EDGE_COLUMNS]
+        return sum(a.nbytes for a in arrays)
+
+    @property
+    def snapper(self):
+        """:class:`snapping.Snapper` for this graph.
+
+        Loaded from the graph artifact's snap index when there is one, built on
+        first use otherwise.
+        """
+        if self._snapper is None and self._snapper_dir is not None:
+            from .graph_store import load_snapper
+
+            self._snapper = load_snapper(self._snapper_dir)
+        if self._snapper is None:
+            from .snapping import Snapper
+
+            self._snapper = Snapper(self)
+        return self._snapper
+
+    @property
+    def in_edges(self):
+        """Reverse CSR ``(in_offsets, in_edge_ids)``: edges into ``v`` are ``in_edge_ids[in_offsets[v]:in_offsets[v + 1]]``."""
+        if self._in_edges is None:
+            order = np.argsort(self.targets, kind="stable").astype(np.int64)
+            in_offsets = np.zeros(self.n_nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.targets, minlength=self.n_nodes), out=in_offsets[1:])
+            self._in_edges = (in_offsets, order)
+        return self._in_edges
+
+    def neighbors(self, u):
+        return self.targets[self.offsets[u]:self.offsets[u + 1]]
+
+    def edge_id(self, u, v):
+        """Id of the edge ``u -> v``, or -1 if there is none."""
+        start, stop = self.offsets[u], self.offsets[u + 1]
+        i = start + np.searchsorted(self.targets[start:stop], v)
+        return int(i) if i < stop and self.targets[i] == v else -1
+
+    def edge_ids(self, u, v):
+        """Vectorized :meth:`edge_id` for arrays of ``u`` and ``v`` (-1 where there is no edge)."""
+        u, v = np.asarray(u, dtype=np.int64), np.asarray(v, dtype=np.int64)
+        if self.n_edges == 0:
+            return np.full(np.broadcast_shapes(u.shape, v.shape), -1)
+        keys = self.sources.astype(np.int64) * self.n_nodes + self.targets
+        query = u * self.n_nodes + v
+        i = np.minimum(np.searchsorted(keys, query), self.n_edges - 1)
+        return np.where((u >= 0) & (v >= 0) & (keys[i] == query), i, -1)
+
+    def edge_weights(self, profile="length"):
+        """Per-edge routing cost for a weight profile.
+
+        ``"length"`` is the metric length, ``"risk"`` scales it by the road's
+        ``Var_mean`` flood risk. Closed edges cost ``inf``.
+        """
+        if profile == "length":
+            weights = self.length
+        elif profile == "risk":
+            weights = self.length * self.var_mean
+        else:
+            raise ValueError(f"Unknown weight profile: {profile!r}")
+        return np.where(self.closed, np.inf, weights) if self.closed.any() else weights
+
+    def to_csr_matrix(self, profile="length", reverse=False):
+        """Adjacency as a ``scipy.sparse.csr_matrix`` for ``scipy.sparse.csgraph``.
+
+        With ``reverse`` the matrix is transposed, so searches run against edge
+        direction (distances *to* the root instead of from it).
+        """
+        key = (profile, reverse)
+        if key not in self._matrices:
+            from scipy.sparse import csr_matrix
+
+            matrix = csr_matrix(
+                (self.edge_weights(profile), self.targets, self.offsets), shape=(self.n_nodes, self.n_nodes)
+            )
+            self._matrices[key] = matrix.transpose().tocsr() if reverse else matrix
+        return self._matrices[key]
+
+    def check_edges(self, edges):
+        """``edges`` as a 1-D int64 array, or ``ValueError`` unless they are edge ids in ``[0, n_edges)``."""
+        edges = np.atleast_1d(np.asarray(edges))
+        if edges.ndim != 1 or (edges.size and not np.issubdtype(edges.dtype, np.integer)):
+            raise ValueError("Edge ids must be a list of integers.")
+        edges = edges.astype(np.int64)
+        if edges.size and (edges.min() < 0 or edges.max() >= self.n_edges):
+            raise ValueError(f"Edge ids must be in [0, {self.n_edges}).")
+        return edges
+
+    def update_edges(self, edges, **columns):
+        """Overwrite edge columns (e.g. ``var_mean``) for ``edges`` and bump ``version``.
+
+        Every column name, edge id and value array is checked before anything
+        is written, so a rejected update (``ValueError``) leaves the graph as it
+        was. Columns memory-mapped from a graph artifact are copied on first
+        write. Anything derived from edge weights should compare ``version`` to
+        notice the change.
+        """
+        edges = self.check_edges(edges)
+        updates = {}
+        for name, values in columns.items():
+            if name not in EDGE_COLUMNS:
+                raise ValueError(f"Unknown edge column: {name!r}")
+            try:
+                values = np.asarray(values, dtype=EDGE_COLUMNS[name])
+            except (TypeError, ValueError) as error:
+                raise ValueError(f"Bad values for {name!r}: {error}") from None
+            if values.ndim > 1 or values.size not in (1, len(edges)):
+                raise ValueError(f"{name!r} needs one value or one per edge, got shape {values.shape}")
+            updates[name] = values
+        for name, values in updates.items():
+            column = getattr(self, name)
+            if not column.flags.writeable:
+                column = np.array(column)
+                setattr(self, name, column)
+            column[edges] = values
+        self._matrices.clear()
+        self.version += 1
+
+    def coords(self, nodes):
+        """``(lon, lat)`` arrays for a node id or a sequence of node ids."""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        return self.lon[nodes], self.lat[nodes]
+
+    def path_cost(self, path, column="length"):
+        """Sum of an edge column (or weight profile) along a node path."""
+        values = getattr(self, column) if column in EDGE_COLUMNS else self.edge_weights(column)
+        return float(sum(values[self.edge_id(u, v)] for u, v in zip(path[:-1], path[1:])))
+
+    def path_roads(self, path):
+        """``preprocessed_Map.csv`` rows a node path runs along, in travel order.
+
+        Consecutive edges of the same road are merged; bridging edges, which
+        belong to no road, appear as -1.
+        """
+        roads = self.road[self.edge_ids(path[:-1], path[1:])]
+        keep = np.ones(len(roads), dtype=bool)
+        keep[1:] = roads[1:] != roads[:-1]
+        return roads[keep]
+
+    def to_networkx(self):
+        """Materialise as an ``nx.DiGraph`` keyed by integer node id (for debugging)."""
+        import networkx as nx
+
+        G = nx.DiGraph()
+        for u in range(self.n_nodes):
+            G.add_node(u, pos=(self.lon[u], self.lat[u]))
+        for e, (u, v) in enumerate(zip(self.sources.tolist(), self.targets.tolist())):
+            G.add_edge(u, v, weight=float(self.length[e]), **{name: getattr(self, name)[e].item() for name in EDGE_COLUMNS})
+        return G
+
+
+def build_road_graph(df, decimals=5, k=4):
+    """Build a bidirectional RoadGraph from a ``preprocessed_Map.csv`` frame.
+
+    Vertices are merged by rounding to ``decimals`` and every vertex is joined to
+    its ``k - 1`` nearest neighbours when not already connected, as the original
+    per-script builders did. Pass ``k=0`` to skip the gap bridging.
+    """
+    import shapely
+
+    geoms = shapely.from_wkt(df["geometry"].to_numpy())
+    xy, line = shapely.get_coordinates(geoms, return_index=True)
+    xy = np.round(xy, decimals)
+    node_xy, node = np.unique(xy, axis=0, return_inverse=True)
+    node = node.ravel()
+    lon, lat = node_xy[:, 0], node_xy[:, 1]
+
+    same_line = line[1:] == line[:-1]
+    src, dst, road = node[:-1][same_line], node[1:][same_line], line[:-1][same_line]
+    not_loop = src != dst
+    src, dst, road = src[not_loop], dst[not_loop], road[not_loop]
+    length = vincenty(lon[src], lat[src], lon[dst], lat[dst])
+
+    columns = {name: np.concatenate([values, values]) for name, values in road_columns(df, road).items()}
+    src, dst = np.concatenate([src, dst]), np.concatenate([dst, src])
+    length = np.concatenate([length, length])
+
+    if k > 1:
+        bridge_src, bridge_dst = _knn_bridges(node_xy, src, dst, k)
+        bridge_length = vincenty(lon[bridge_src], lat[bridge_src], lon[bridge_dst], lat[bridge_dst])
+        n_bridges = len(bridge_src)
+        src = np.concatenate([src, bridge_src])
+        dst = np.concatenate([dst, bridge_dst])
+        length = np.concatenate([length, bridge_length])
+        columns = {name: np.concatenate([values, np.full(n_bridges, BRIDGE_ATTRIBUTES[name])]) for name, values in columns.items()}
+
+    return RoadGraph.from_edges(lon, lat, src, dst, length=length, **columns)
+
+
+def road_columns(df, road):
+    """Edge columns taken from the ``preprocessed_Map.csv`` rows ``road`` (one per edge)."""
+    var_mean = df["Var_mean"].fillna(BRIDGE_ATTRIBUTES["var_mean"])
+    # Roads with a single reading have no range; use the mean for both ends
+    return {
+        "var_mean": var_mean.to_numpy()[road],
+        "var_min": df["Var_min"].fillna(var_mean).to_numpy()[road],
+        "var_max": df["Var_max"].fillna(var_mean).to_numpy()[road],
+        "lanes": df["lanes"].fillna(BRIDGE_ATTRIBUTES["lanes"]).to_numpy()[road],
+        "surface_encoded": df["surface_encoded"].fillna(BRIDGE_ATTRIBUTES["surface_encoded"]).to_numpy()[road],
+        "highway": highway_codes(df["highway"])[road] if "highway" in df else np.full(len(road), BRIDGE_ATTRIBUTES["highway"]),
+        "road": road,
+    }
+
+
+def highway_codes(highway):
+    """``HIGHWAY_CLASSES`` positions for a column of OSM ``highway`` values (-1 for others)."""
+    codes = {name: i for i, name in enumerate(HIGHWAY_CLASSES)}
+    return highway.map(codes).fillna(BRIDGE_ATTRIBUTES["highway"]).to_numpy(dtype=np.int8)
+
+
+def _knn_bridges(node_xy, src, dst, k):
+    """Bidirectional edges from every vertex to its ``k - 1`` nearest vertices not already linked."""
+    from sklearn.neighbors import KDTree
+
+    n = len(node_xy)
+    _, indices = KDTree(node_xy).query(node_xy, k=min(k, n))
+    a = np.repeat(np.arange(n), indices.shape[1] - 1)
+    b = indices[:, 1:].ravel()
+    existing = np.unique(src.astype(np.int64) * n + dst)
+    new = ~np.isin(a.astype(np.int64) * n + b, existing) & (a != b)
+    a, b = a[new], b[new]
+    return np.concatenate([a, b]), np.concatenate([b, a])
+
+
+def load_road_graph(path=DEFAULT_MAP_CSV, decimals=5, k=4):
+    """Read ``preprocessed_Map.csv`` and build the shared RoadGraph."""
+    import pandas as pd
+
+    return build_road_graph(pd.read_csv(path), decimals=decimals, k=k)
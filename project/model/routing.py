@@ -0,0 +1,415 @@
+import heapq
+
+import numpy as np
+
+from .distance import haversine
+
+
+def walk_predecessors(predecessors, node):
+    """Follow a predecessor array from ``node`` back to its search root."""
+    path = [int(node)]
+    while predecessors[path[-1]] >= 0:
+        path.append(int(predecessors[path[-1]]))
+    return path
+
+
+def tree_accumulate(graph, next_hop, values):
+    """Sum an edge column along every node's tree path to the root.
+
+    ``next_hop`` is a tree as returned by :class:`ShelterRoutes` and ``values``
+    a per-edge array (e.g. ``graph.length * graph.var_mean`` for accumulated
+    flood risk), or a ``(samples, edges)`` matrix to accumulate many
+    realizations at once. Uses pointer doubling, so it is vectorized and takes
+    O(n log depth). Nodes without a next hop (roots, unreachable) get 0.
+    """
+    values = np.asarray(values)
+    n = len(next_hop)
+    has_next = next_hop >= 0
+    nodes = np.arange(n)
+    nxt = np.where(has_next, next_hop, nodes)
+    total = np.zeros(values.shape[:-1] + (n,), dtype=np.result_type(values.dtype, np.float32))
+    edges = graph.edge_ids(nodes[has_next], next_hop[has_next])
+    total[..., has_next] = values[..., edges]
+    # total[u] is the sum from u to nxt[u]; roots point at themselves and add 0
+    while (nxt != nxt[nxt]).any():
+        total = total + total[..., nxt]
+        nxt = nxt[nxt]
+    return total
+
+
+def _search(graph, source, weights, targets):
+    """Dijkstra from ``source`` until every node in ``targets`` is settled (or the heap runs dry).
+
+    Returns the ``dist`` and ``predecessors`` dicts of the explored region.
+    """
+    offsets, all_targets = graph.offsets, graph.targets
+    remaining = set(targets)
+    dist = {source: 0.0}
+    predecessors = {source: -1}
+    settled = set()
+    heap = [(0.0, source)]
+    while heap and remaining:
+        d, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled.add(u)
+        remaining.discard(u)
+        start, stop = offsets[u], offsets[u + 1]
+        for v, w in zip(all_targets[start:stop].tolist(), weights[start:stop].tolist()):
+            nd = d + w
+            if nd < dist.get(v, np.inf):
+                dist[v] = nd
+                predecessors[v] = u
+                heapq.heappush(heap, (nd, v))
+    for v in remaining:
+        dist.pop(v, None)
+    return dist, predecessors
+
+
+def _unwind(predecessors, node):
+    path = [node]
+    while predecessors[path[-1]] >= 0:
+        path.append(predecessors[path[-1]])
+    return path[::-1]
+
+
+def shortest_path(graph, source, target, profile="length"):
+    """Node path from ``source`` to ``target`` on a RoadGraph, or None if unreachable.
+
+    Plain Dijkstra that stops as soon as ``target`` is settled. It reads the CSR
+    arrays directly, so it only needs NumPy (no SciPy import on cold start).
+    """
+    return shortest_paths(graph, source, [target], profile)[target]
+
+
+def shortest_paths(graph, source, targets, profile="length"):
+    """Paths from ``source`` to each of ``targets`` from a single search.
+
+    Returns ``{target: path or None}``. The search stops once the last target
+    is settled, so asking for many shelters costs one Dijkstra, not one each.
+    """
+    targets = [int(t) for t in np.atleast_1d(targets)]
+    dist, predecessors = _search(graph, int(source), graph.edge_weights(profile), targets)
+    return {t: _unwind(predecessors, t) if t in dist else None for t in targets}
+
+
+def heuristic_scale(graph, weights):
+    """Largest ``c`` with ``weights[e] >= c * haversine(e)`` for every edge.
+
+    ``c`` times the haversine distance to the target is then an admissible and
+    consistent A* heuristic for ``weights``, whatever the profile (and it
+    absorbs the small haversine/ellipsoid difference of metric lengths).
+    """
+    straight = haversine(graph.lon[graph.sources], graph.lat[graph.sources], graph.lon[graph.targets], graph.lat[graph.targets])
+    positive = straight > 0
+    return float(np.min(weights[positive] / straight[positive])) if positive.any() else 0.0
+
+
+class PathFinder:
+    """Point-to-point searches on a RoadGraph that count the nodes they settle.
+
+    :meth:`dijkstra`, :meth:`astar`, :meth:`bidirectional` and :meth:`alt`
+    return the node path from ``source`` to ``target`` (None if unreachable)
+    and leave the number of settled nodes of that query in ``settled``, so the
+    goal-directed searches can be compared against plain Dijkstra. ALT uses
+    ``landmarks`` when given, otherwise those saved with the graph (see
+    ``landmarks.open_landmarks``).
+    """
+
+    def __init__(self, graph, profile="length", landmarks=None):
+        self.graph = graph
+        self.profile = profile
+        self.landmarks = landmarks
+        self.settled = 0
+        self._version = None
+
+    def _weights(self):
+        if self._version != self.graph.version:
+            self._edge_weights = self.graph.edge_weights(self.profile)
+            self._scale = None
+            self._version = self.graph.version
+        return self._edge_weights
+
+    def _search(self, source, target, heuristic):
+        """A* from ``source`` to ``target``; ``heuristic(nodes)`` bounds their remaining cost."""
+        offsets, targets = self.graph.offsets, self.graph.targets
+        weights = self._weights()
+        dist = {source: 0.0}
+        predecessors = {source: -1}
+        settled = set()
+        heap = [(float(heuristic(np.array([source]))[0]), source)]
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            if u == target:
+                break
+            start, stop = offsets[u], offsets[u + 1]
+            d = dist[u]
+            nodes = targets[start:stop]
+            for v, w, h in zip(nodes.tolist(), weights[start:stop].tolist(), heuristic(nodes).tolist()):
+                nd = d + w
+                if nd < dist.get(v, np.inf) and v not in settled:
+                    dist[v] = nd
+                    predecessors[v] = u
+                    heapq.heappush(heap, (nd + h, v))
+        self.settled = len(settled)
+        return _unwind(predecessors, target) if target in settled else None
+
+    def dijkstra(self, source, target):
+        """Plain Dijkstra, the baseline for ``settled``."""
+        return self._search(int(source), int(target), lambda nodes: np.zeros(len(nodes)))
+
+    def astar(self, source, target):
+        """A* with the haversine distance to ``target`` scaled to the weight profile."""
+        weights = self._weights()
+        if self._scale is None:
+            self._scale = heuristic_scale(self.graph, weights)
+        lon, lat, scale = self.graph.lon, self.graph.lat, self._scale
+        t_lon, t_lat = lon[target], lat[target]
+        return self._search(int(source), int(target), lambda nodes: scale * haversine(lon[nodes], lat[nodes], t_lon, t_lat))
+
+    def alt(self, source, target):
+        """A* with landmark lower bounds; valid while weights have not dropped since the tables were built."""
+        from .landmarks import open_landmarks
+
+        if self.landmarks is None:
+            self.landmarks = open_landmarks(self.graph, self.profile)
+        landmarks, target = self.landmarks, int(target)
+        return self._search(int(source), target, lambda nodes: landmarks.lower_bound(nodes, target))
+
+    def bidirectional(self, source, target):
+        """Dijkstra from both ends at once, stopping when the two frontiers can no longer improve the best meeting."""
+        source, target = int(source), int(target)
+        graph = self.graph
+        weights = self._weights()
+        in_offsets, in_edge_ids = graph.in_edges
+        adjacency = (
+            lambda u: (graph.targets[graph.offsets[u]:graph.offsets[u + 1]], weights[graph.offsets[u]:graph.offsets[u + 1]]),
+            lambda u: (graph.sources[in_edge_ids[in_offsets[u]:in_offsets[u + 1]]], weights[in_edge_ids[in_offsets[u]:in_offsets[u + 1]]]),
+        )
+        dist = ({source: 0.0}, {target: 0.0})
+        predecessors = ({source: -1}, {target: -1})
+        settled = (set(), set())
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meeting = (0.0, source) if source == target else (np.inf, -1)
+        while heaps[0] and heaps[1] and heaps[0][0][0] + heaps[1][0][0] < best:
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            d, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+            nodes, costs = adjacency[side](u)
+            for v, w in zip(nodes.tolist(), costs.tolist()):
+                nd = d + w
+                if nd < dist[side].get(v, np.inf):
+                    dist[side][v] = nd
+                    predecessors[side][v] = u
+                    heapq.heappush(heaps[side], (nd, v))
+                if v in dist[1 - side] and nd + dist[1 - side][v] < best:
+                    best, meeting = nd + dist[1 - side][v], v
+        self.settled = len(settled[0]) + len(settled[1])
+        if meeting < 0:
+            return None
+        return _unwind(predecessors[0], meeting) + _unwind(predecessors[1], meeting)[::-1][1:]
+
+
+def repair_tree(graph, weights, dist, next_hop, edges, old_weights, root=None):
+    """Repair a reverse shortest-path tree in place after the weights of ``edges`` changed.
+
+    ``dist``/``next_hop`` hold, for every node, the cost to the tree's root and
+    the next node towards it (as returned by a reverse csgraph Dijkstra);
+    ``weights`` are the new per-edge weights and ``old_weights`` the previous
+    weights of ``edges``. For multi-root trees pass ``root`` (root per node) to
+    keep it in sync. Nodes whose tree path used an edge that became more
+    expensive are invalidated and re-attached, then cost decreases propagate
+    backwards from the changed edges, so the work is proportional to the part
+    of the tree that actually changes. Returns the number of nodes updated.
+    """
+    offsets, targets, sources = graph.offsets, graph.targets, graph.sources
+    in_offsets, in_edge_ids = graph.in_edges
+    edges = np.asarray(edges, dtype=np.int64)
+    increased = edges[np.asarray(weights[edges]) > np.asarray(old_weights)]
+
+    # Invalidate every node whose path ran over an edge that became more expensive
+    affected = set()
+    for e in increased.tolist():
+        u, v = int(sources[e]), int(targets[e])
+        if next_hop[u] != v or u in affected:
+            continue
+        stack = [u]
+        affected.add(u)
+        while stack:
+            x = stack.pop()
+            for f in in_edge_ids[in_offsets[x]:in_offsets[x + 1]].tolist():
+                y = int(sources[f])
+                if next_hop[y] == x and y not in affected:
+                    affected.add(y)
+                    stack.append(y)
+    for a in affected:
+        dist[a] = np.inf
+        next_hop[a] = -9999
+        if root is not None:
+            root[a] = -1
+
+    # Re-attach invalidated nodes through their best edge into the intact tree
+    heap = []
+    for a in affected:
+        start, stop = offsets[a], offsets[a + 1]
+        for w, c in zip(targets[start:stop].tolist(), weights[start:stop].tolist()):
+            if w not in affected and c + dist[w] < dist[a]:
+                dist[a] = c + dist[w]
+                next_hop[a] = w
+                if root is not None:
+                    root[a] = root[w]
+        if np.isfinite(dist[a]):
+            heap.append((float(dist[a]), a))
+
+    # Edges that became cheaper may offer shortcuts
+    for e in edges.tolist():
+        u, v = int(sources[e]), int(targets[e])
+        cand = weights[e] + dist[v]
+        if cand < dist[u]:
+            dist[u] = cand
+            next_hop[u] = v
+            if root is not None:
+                root[u] = root[v]
+            heap.append((float(cand), u))
+
+    heapq.heapify(heap)
+    updated = set(affected)
+    while heap:
+        d, x = heapq.heappop(heap)
+        if d > dist[x]:
+            continue
+        updated.add(x)
+        ids = in_edge_ids[in_offsets[x]:in_offsets[x + 1]]
+        for y, c in zip(sources[ids].tolist(), weights[ids].tolist()):
+            if d + c < dist[y]:
+                dist[y] = d + c
+                next_hop[y] = x
+                if root is not None:
+                    root[y] = root[x]
+                heapq.heappush(heap, (d + c, y))
+    return len(updated)
+
+
+class ShelterRoutes:
+    """Routes from any node to a fixed set of shelters via reverse shortest-path trees.
+
+    One reverse Dijkstra per shelter yields, for every node, the distance to the
+    shelter and the next hop towards it; a route is then read off the tree in
+    O(path length). Trees are built on first use. Changes made through
+    :meth:`update_edges` / :meth:`close_edges` repair the cached trees
+    incrementally; any other change to the graph's ``version`` (see
+    ``RoadGraph.update_edges``) makes them rebuild from scratch.
+    """
+
+    def __init__(self, graph, shelters, profile="length"):
+        self.graph = graph
+        self.shelters = [int(s) for s in np.atleast_1d(shelters)]
+        self.profile = profile
+        self._trees = {}
+        self._nearest = None
+        self._version = graph.version
+
+    def copy(self):
+        """ShelterRoutes with its own copies of the cached trees, e.g. to repair while this one keeps serving."""
+        other = ShelterRoutes(self.graph, self.shelters, self.profile)
+        other._version = self._version
+        other._trees = {s: tuple(a.copy() for a in tree) for s, tree in dict(self._trees).items()}
+        nearest = self._nearest
+        other._nearest = None if nearest is None else tuple(a.copy() for a in nearest)
+        return other
+
+    def _check_version(self):
+        if self._version != self.graph.version:
+            self._trees.clear()
+            self._nearest = None
+            self._version = self.graph.version
+
+    def tree(self, shelter):
+        """``(distance, next_hop)`` arrays of the reverse tree rooted at ``shelter``."""
+        from scipy.sparse.csgraph import dijkstra
+
+        self._check_version()
+        if shelter not in self._trees:
+            matrix = self.graph.to_csr_matrix(self.profile, reverse=True)
+            self._trees[shelter] = dijkstra(matrix, indices=shelter, return_predecessors=True)
+        return self._trees[shelter]
+
+    def distance(self, origin, shelter):
+        """Cost from ``origin`` (node id or array of ids) to ``shelter``; ``inf`` if unreachable."""
+        return self.tree(shelter)[0][origin]
+
+    def route(self, origin, shelter):
+        """Node path from ``origin`` to ``shelter``, or None if unreachable."""
+        dist, next_hop = self.tree(shelter)
+        if not np.isfinite(dist[origin]):
+            return None
+        return walk_predecessors(next_hop, origin)
+
+    def nearest_tree(self):
+        """``(distance, next_hop, shelter)`` arrays of one multi-source reverse search from all shelters.
+
+        For every node this is the cost to its nearest shelter, the next hop
+        towards it and which shelter that is (-1 where none is reachable).
+        """
+        from scipy.sparse.csgraph import dijkstra
+
+        self._check_version()
+        if self._nearest is None:
+            matrix = self.graph.to_csr_matrix(self.profile, reverse=True)
+            self._nearest = dijkstra(
+                matrix, indices=self.shelters, min_only=True, return_predecessors=True
+            )
+            self._nearest[2][~np.isfinite(self._nearest[0])] = -1
+        return self._nearest
+
+    def nearest(self, origins):
+        """``(shelter, distance)`` of the nearest shelter for a node id or an array of them."""
+        dist, _, source = self.nearest_tree()
+        return source[origins], dist[origins]
+
+    def route_to_nearest(self, origin):
+        """Node path from ``origin`` to its nearest shelter, or None if none is reachable."""
+        dist, next_hop, _ = self.nearest_tree()
+        if not np.isfinite(dist[origin]):
+            return None
+        return walk_predecessors(next_hop, origin)
+
+    def update_edges(self, edges, **columns):
+        """Change edge columns (e.g. new ``var_mean`` readings) and repair every cached tree.
+
+        Returns the number of tree nodes whose distance or next hop was touched.
+        """
+        self._check_version()
+        edges = self.graph.check_edges(edges)
+        old_weights = self.graph.edge_weights(self.profile)[edges]
+        self.graph.update_edges(edges, **columns)
+        return self.repair(edges, old_weights)
+
+    def repair(self, edges, old_weights):
+        """Repair every cached tree after one ``graph.update_edges`` call changed ``edges`` from ``old_weights``.
+
+        For several ShelterRoutes sharing a graph: read each one's old weights,
+        update the graph once, then repair each. Returns the touched node count.
+        """
+        edges = np.asarray(edges, dtype=np.int64)
+        if self.graph.version != self._version + 1:
+            self._check_version()
+            return 0
+        self._version = self.graph.version
+        weights = self.graph.edge_weights(self.profile)
+        touched = 0
+        for dist, next_hop in self._trees.values():
+            touched += repair_tree(self.graph, weights, dist, next_hop, edges, old_weights)
+        if self._nearest is not None:
+            dist, next_hop, source = self._nearest
+            touched += repair_tree(self.graph, weights, dist, next_hop, edges, old_weights, root=source)
+        return touched
+
+    def close_edges(self, edges, closed=True):
+        """Close (or with ``closed=False`` reopen) roads and repair every cached tree."""
+        return self.update_edges(edges, closed=closed)
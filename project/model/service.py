@@ -0,0 +1,243 @@
+"""Local asyncio HTTP routing service with a versioned route cache.
+
+The road graph, its snap index and the shelter trees stay resident for the
+lifetime of the process. Snapping runs on the event loop, which costs one
+KD-tree lookup. Route searches run on a thread pool sharing the graph, so the
+loop never blocks on them and a hazard update is seen by every worker at once.
+
+Routes are cached in an LRU keyed by ``(snapped origin, shelter, profile,
+graph version)``. A hazard update bumps ``RoadGraph.version``, which makes
+every older entry unreachable, and the cache is cleared. The shelter trees
+are repaired incrementally on copies, which replace the serving trees once
+repaired, so a search never reads a tree that is half updated. Identical queries
+arriving while one is being computed wait for that computation instead of
+starting their own.
+
+Endpoints (JSON responses; the service binds to localhost by default):
+
+* ``GET /route?lon=..&lat=..[&shelter=i][&profile=length|risk]``: route to
+  shelter ``i`` (position in the shelter list) or to the nearest shelter.
+* ``POST /hazard`` with ``{"edges": [...], "var_mean": [...]}`` (any edge
+  column, e.g. ``closed``): update edges and invalidate the cache.
+* ``GET /status``: graph version, cache size, hit and miss counts.
+
+::
+
+    python -m model.service --port 8080 --workers 4
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .graph_store import open_road_graph
+from .io import parse_lonlat
+from .routing import ShelterRoutes
+from .sweep import DEFAULT_SHELTER_SETS
+
+PROFILES = ("length", "risk")
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class RequestError(ValueError):
+    """A request the service cannot answer; ``status`` is the HTTP status to reply with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class RoutingService:
+    """Routes from coordinates to ``shelters`` (``(lon, lat)`` pairs) on ``graph``."""
+
+    def __init__(self, graph, shelters=None, workers=None, cache_size=10000, max_snap=200.0):
+        self.graph = graph
+        lon, lat = np.asarray(DEFAULT_SHELTER_SETS["default"] if shelters is None else shelters,
+                              dtype=np.float64).reshape(-1, 2).T
+        self.shelters = graph.snapper.nearest_node(lon, lat, max_distance=float("inf"))[0].tolist()
+        self.max_snap = max_snap
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._routes = {profile: ShelterRoutes(graph, self.shelters, profile) for profile in PROFILES}
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._update_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers or os.cpu_count())
+
+    async def route(self, lon, lat, shelter=None, profile="length"):
+        """Route dict for a point; ``shelter`` is a position in the shelter list, None for the nearest."""
+        if profile not in PROFILES:
+            raise RequestError(f"Unknown weight profile: {profile!r}")
+        if shelter is not None and not 0 <= shelter < len(self.shelters):
+            raise RequestError(f"Unknown shelter: {shelter!r}", status=404)
+        origin, _ = self.graph.snapper.nearest_node(lon, lat, max_distance=self.max_snap)
+        if origin < 0:
+            raise RequestError("Too far from road network.", status=404)
+        key = (int(origin), shelter, profile, self.graph.version)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        self.misses += 1
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self._pool, self._compute, *key[:3])
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._finish(key, f))
+        # Shielded so a client hanging up does not cancel the search for the others waiting on it
+        return await asyncio.shield(future)
+
+    def _finish(self, key, future):
+        del self._inflight[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        if result["version"] == self.graph.version:
+            self._cache[(*key[:3], result["version"])] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _compute(self, origin, shelter, profile):
+        """Route from node ``origin`` (runs on the worker pool); retried if the hazard changes meanwhile."""
+        while True:
+            version = self.graph.version
+            routes = self._routes[profile]
+            path = routes.route_to_nearest(origin) if shelter is None else routes.route(origin, self.shelters[shelter])
+            result = {"origin": origin, "profile": profile, "version": version, "shelter": None,
+                      "metres": None, "risk": None, "nodes": None, "coordinates": None}
+            if path is not None:
+                edges = self.graph.edge_ids(path[:-1], path[1:])
+                lon, lat = self.graph.coords(path)
+                result.update(
+                    shelter=self.shelters.index(path[-1]),
+                    metres=float(self.graph.length[edges].sum()),
+                    risk=float((self.graph.length[edges] * self.graph.var_mean[edges]).sum()),
+                    nodes=path,
+                    coordinates=np.column_stack([lon, lat]).tolist(),
+                )
+            if self.graph.version == version:
+                return result
+
+    def update_hazard(self, edges, **columns):
+        """Overwrite edge columns, bump the graph version, repair the shelter trees and drop every cached route."""
+        with self._update_lock:
+            try:
+                edges = self.graph.check_edges(edges)
+                old_weights = {profile: self.graph.edge_weights(profile)[edges] for profile in PROFILES}
+                routes = {profile: r.copy() for profile, r in self._routes.items()}
+                self.graph.update_edges(edges, **columns)
+            except ValueError as error:
+                raise RequestError(str(error)) from error
+            for profile, r in routes.items():
+                r.repair(edges, old_weights[profile])
+            # Searches still running on the old trees are retried by _compute
+            self._routes = routes
+        self._cache.clear()
+        return self.graph.version
+
+    def status(self):
+        return {"version": self.graph.version, "cached": len(self._cache), "hits": self.hits,
+                "misses": self.misses, "shelters": self.shelters}
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/route":
+            if method != "GET":
+                raise RequestError("Use GET.", status=405)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                lon, lat = float(query["lon"]), float(query["lat"])
+                shelter = int(query["shelter"]) if "shelter" in query else None
+            except (KeyError, ValueError) as error:
+                raise RequestError("Expected lon, lat and optionally shelter as numbers.") from error
+            return await self.route(lon, lat, shelter, query.get("profile", "length"))
+        if url.path == "/hazard":
+            if method != "POST":
+                raise RequestError("Use POST.", status=405)
+            try:
+                update = json.loads(body or b"{}")
+                edges = update.pop("edges")
+            except (ValueError, KeyError, AttributeError) as error:
+                raise RequestError("Expected a JSON object with edges and edge columns.") from error
+            # Repairing the shelter trees can take a while; _update_lock keeps updates in order
+            version = await asyncio.get_running_loop().run_in_executor(
+                self._pool, functools.partial(self.update_hazard, edges, **update))
+            return {"version": version}
+        if url.path == "/status":
+            return self.status()
+        raise RequestError(f"Unknown path: {url.path!r}", status=404)
+
+    async def handle(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection until the client closes it."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                try:
+                    status, payload = 200, await self._dispatch(method, target, body)
+                except RequestError as error:
+                    status, payload = error.status, {"error": str(error)}
+                except Exception as error:
+                    status, payload = 500, {"error": f"{type(error).__name__}: {error}"}
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._pool.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve evacuation routes over HTTP on this machine.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--shelters", nargs="+", type=parse_lonlat, metavar="LON,LAT")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cache-size", type=int, default=10000, help="routes kept in the LRU cache")
+    parser.add_argument("--max-snap", type=float, default=200.0, help="metres an origin may be from the network")
+    args = parser.parse_args(argv)
+
+    service = RoutingService(open_road_graph(), args.shelters, args.workers, args.cache_size, args.max_snap)
+    print(f"Serving routes on http://{args.host}:{args.port}/route")
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Snapping of clicks and household coordinates onto the road graph.
+
+Coordinates are projected to a local equirectangular plane in metres (centred
+on the graph's mean latitude), so every threshold and returned distance is in
+metres. Within a barangay or city the projection error is far below GPS noise.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .distance import EARTH_RADIUS_M
+
+DEFAULT_MAX_DISTANCE_M = 50.0
+
+EdgeSnap = namedtuple("EdgeSnap", ["edge", "fraction", "distance", "lon", "lat"])
+EdgeSnap.__doc__ = """Nearest point on the network: edge id, position along it (0 at the source node), metres and snapped coordinates."""
+
+
+class Snapper:
+    """Nearest-node, k-nearest and nearest-edge queries for one RoadGraph.
+
+    Every query accepts scalars or arrays of ``lon``/``lat`` and answers with the
+    same shape. Points further than ``max_distance`` metres from the network, or
+    with NaN or infinite coordinates, get node/edge ``-1`` and distance ``inf``.
+    """
+
+    def __init__(self, graph, max_distance=DEFAULT_MAX_DISTANCE_M, piece_length=25.0):
+        self.max_distance = max_distance
+        self.lat0 = float(np.mean(graph.lat)) if graph.n_nodes else 0.0
+        self._set_scale()
+        self.node_xy = np.column_stack(self.project(graph.lon, graph.lat))
+
+        # One segment per road link: keep u -> v when u < v or when there is no v -> u
+        n = graph.n_nodes
+        src, dst = graph.sources.astype(np.int64), graph.targets.astype(np.int64)
+        has_reverse = np.isin(dst * n + src, src * n + dst)
+        self.segment_edge = np.flatnonzero((src < dst) | ~has_reverse)
+        a = self.node_xy[src[self.segment_edge]]
+        b = self.node_xy[dst[self.segment_edge]]
+        self._seg_a, self._seg_ab = a, b - a
+
+        # Long segments are cut into pieces so a tree over piece midpoints bounds the search
+        seg_length = np.hypot(self._seg_ab[:, 0], self._seg_ab[:, 1])
+        n_pieces = np.maximum(np.ceil(seg_length / piece_length), 1).astype(np.int64)
+        self.piece_segment = np.repeat(np.arange(len(seg_length)), n_pieces)
+        first = np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+        t = (np.arange(len(self.piece_segment)) - first + 0.5) / n_pieces[self.piece_segment]
+        self.piece_xy = a[self.piece_segment] + t[:, None] * self._seg_ab[self.piece_segment]
+        self._half_piece = float((seg_length / n_pieces).max() / 2) if len(seg_length) else 0.0
+        self._build_trees()
+
+    def to_arrays(self):
+        """The index as plain arrays, for :meth:`from_arrays` (the KD-trees are rebuilt from them)."""
+        return {
+            "lat0": np.array([self.lat0]),
+            "half_piece": np.array([self._half_piece]),
+            "node_xy": self.node_xy,
+            "segment_edge": self.segment_edge,
+            "seg_a": self._seg_a,
+            "seg_ab": self._seg_ab,
+            "piece_segment": self.piece_segment,
+            "piece_xy": self.piece_xy,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, max_distance=DEFAULT_MAX_DISTANCE_M):
+        """Snapper from :meth:`to_arrays` output, without needing the graph."""
+        self = cls.__new__(cls)
+        self.max_distance = max_distance
+        self.lat0 = arrays["lat0"].item()
+        self._half_piece = arrays["half_piece"].item()
+        self._set_scale()
+        self.node_xy, self.segment_edge = arrays["node_xy"], arrays["segment_edge"]
+        self._seg_a, self._seg_ab = arrays["seg_a"], arrays["seg_ab"]
+        self.piece_segment, self.piece_xy = arrays["piece_segment"], arrays["piece_xy"]
+        self._build_trees()
+        return self
+
+    def _set_scale(self):
+        self._kx = EARTH_RADIUS_M * np.cos(np.radians(self.lat0)) * np.pi / 180
+        self._ky = EARTH_RADIUS_M * np.pi / 180
+
+    def _build_trees(self):
+        from scipy.spatial import cKDTree
+
+        self.node_tree = cKDTree(self.node_xy)
+        self.piece_tree = cKDTree(self.piece_xy) if len(self.piece_xy) else None
+
+    def project(self, lon, lat):
+        """Local metric ``(x, y)`` for coordinates in degrees."""
+        return np.asarray(lon, dtype=np.float64) * self._kx, np.asarray(lat, dtype=np.float64) * self._ky
+
+    def unproject(self, x, y):
+        return np.asarray(x) / self._kx, np.asarray(y) / self._ky
+
+    def _points(self, lon, lat):
+        x, y = self.project(lon, lat)
+        shape = np.broadcast_shapes(x.shape, y.shape)
+        return np.column_stack([np.broadcast_to(x, shape).ravel(), np.broadcast_to(y, shape).ravel()]), shape
+
+    def nearest_node(self, lon, lat, max_distance=None):
+        """``(node, metres)`` of the closest node to each point."""
+        return self.k_nearest_nodes(lon, lat, k=1, max_distance=max_distance)
+
+    def k_nearest_nodes(self, lon, lat, k, max_distance=None):
+        """``(nodes, metres)`` of the ``k`` closest nodes, nearest first.
+
+        With ``k > 1`` the results gain a trailing axis of length ``k``; missing
+        neighbours are ``-1`` / ``inf``.
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        points, shape = self._points(lon, lat)
+        # NaN or inf coordinates (blank input rows) snap to nothing
+        finite = np.isfinite(points).all(axis=1)
+        dist = np.full((len(points), k), np.inf)
+        nodes = np.full((len(points), k), -1, dtype=np.int64)
+        if finite.any():
+            found_dist, found = self.node_tree.query(points[finite], k=k, distance_upper_bound=max_distance)
+            dist[finite] = found_dist.reshape(-1, k)
+            nodes[finite] = np.where(np.isfinite(found_dist), found, -1).reshape(-1, k)
+        out_shape = shape if k == 1 else shape + (k,)
+        nodes, dist = nodes.reshape(out_shape), dist.reshape(out_shape)
+        return (int(nodes), float(dist)) if nodes.ndim == 0 else (nodes, dist)
+
+    def nearest_edge(self, lon, lat, max_distance=None, candidates=8):
+        """Project each point onto the closest road segment.
+
+        Returns an :data:`EdgeSnap`. The ``candidates`` nearest segment pieces are
+        checked exactly in one vectorized pass; points whose answer that pass
+        cannot prove are retried with four times as many candidates, so the
+        result is exact.
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        points, shape = self._points(lon, lat)
+        m = len(points)
+        segment = np.full(m, -1, dtype=np.int64)
+        dist = np.full(m, np.inf)
+        todo = np.flatnonzero(np.isfinite(points).all(axis=1)) if self.piece_tree is not None else np.arange(0)
+        k = candidates
+        while len(todo):
+            k = min(k, self.piece_tree.n)
+            segment[todo], dist[todo], proven = self._nearest_segment(points[todo], k, max_distance)
+            todo = todo[~proven]
+            k *= 4
+        segment = np.where(dist <= max_distance, segment, -1)
+        hit = segment >= 0
+        edge = np.full(m, -1, dtype=np.int64)
+        fraction, snap_lon, snap_lat = np.full(m, np.nan), np.full(m, np.nan), np.full(m, np.nan)
+        dist = np.where(hit, dist, np.inf)
+        if hit.any():
+            edge[hit] = self.segment_edge[segment[hit]]
+            fraction[hit] = self._segment_fraction(points[hit], segment[hit])
+            snapped = self._seg_a[segment[hit]] + fraction[hit][:, None] * self._seg_ab[segment[hit]]
+            snap_lon[hit], snap_lat[hit] = self.unproject(snapped[:, 0], snapped[:, 1])
+        fields = [a.reshape(shape) for a in (edge, fraction, dist, snap_lon, snap_lat)]
+        if not shape:
+            return EdgeSnap(int(fields[0]), *(float(f) for f in fields[1:]))
+        return EdgeSnap(*fields)
+
+    def _nearest_segment(self, points, k, max_distance):
+        """Best of the ``k`` nearest pieces per point, and whether it is provably the nearest segment."""
+        m = len(points)
+        piece_dist, pieces = self.piece_tree.query(points, k=k, distance_upper_bound=max_distance + self._half_piece)
+        pieces, piece_dist = pieces.reshape(m, k), piece_dist.reshape(m, k)
+        found = pieces < self.piece_tree.n
+        cand = np.where(found, self.piece_segment[np.minimum(pieces, self.piece_tree.n - 1)], -1)
+        cand_dist = np.where(found, self._segment_distance(np.repeat(points, k, axis=0), cand.ravel()).reshape(m, k), np.inf)
+        best = cand_dist.argmin(axis=1)
+        dist = cand_dist[np.arange(m), best]
+        # Any segment outside the candidates is at least (kth piece distance - half piece) away
+        proven = ~found[:, -1] | (dist <= piece_dist[:, -1] - self._half_piece) | (k == self.piece_tree.n)
+        return cand[np.arange(m), best], dist, proven
+
+    def _segment_fraction(self, points, segment):
+        ab = self._seg_ab[segment]
+        denom = np.einsum("ij,ij->i", ab, ab)
+        t = np.einsum("ij,ij->i", points - self._seg_a[segment], ab) / np.where(denom > 0, denom, 1.0)
+        return np.clip(t, 0.0, 1.0)
+
+    def _segment_distance(self, points, segment):
+        safe = np.maximum(segment, 0)
+        t = self._segment_fraction(points, safe)
+        closest = self._seg_a[safe] + t[:, None] * self._seg_ab[safe]
+        return np.hypot(*(points - closest).T)
@@ -0,0 +1,236 @@
+"""Headless sweeps of evacuation scenarios over flood hazard variants.
+
+A scenario is a dict with the keys of ``SCENARIO_DEFAULTS``:
+
+* ``hazard``: ``"Var_min"``, ``"Var_mean"`` or ``"Var_max"``, or a quantile
+  ``q`` in ``[0, 1]`` interpolating each road between its minimum and maximum
+  reading.
+* ``rainfall``: factor the hazard is scaled by (1.0 = as surveyed).
+* ``shelters``: name of a shelter set (see ``DEFAULT_SHELTER_SETS``). On the
+  command line a set can also be given as ``"LON,LAT;LON,LAT"``, which is
+  then its name.
+* ``profile``: routing weight profile, ``"length"`` or ``"risk"``.
+* ``evacuees``: number of agents, placed on random nodes drawn with ``seed``.
+* ``close_above``: roads whose scaled hazard reaches this value are closed.
+
+:func:`run_sweep` fans scenarios out over a process pool. Workers are not sent
+the graph: each opens the graph artifact directory, whose arrays are
+memory-mapped read-only, so every worker reads the same physical pages from
+the OS page cache. Metrics are streamed to a CSV file, or a Parquet file when
+the output ends in ``.parquet`` (needs pyarrow), as scenarios finish.
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .graph_store import artifact_dir, load_graph
+from .io import ResultWriter, parse_lonlat
+from .road_graph import DEFAULT_MAP_CSV, EDGE_COLUMNS, RoadGraph
+from .routing import ShelterRoutes, tree_accumulate
+from .simulation import EvacuationSim
+
+# Hazard level name (RoadMapWithHazard.csv column) -> RoadGraph edge column
+HAZARD_LEVELS = {"Var_min": "var_min", "Var_mean": "var_mean", "Var_max": "var_max"}
+
+SCENARIO_DEFAULTS = {
+    "hazard": "Var_mean",
+    "rainfall": 1.0,
+    "shelters": "default",
+    "profile": "length",
+    "evacuees": 1000,
+    "close_above": float("inf"),
+    "seed": 0,
+}
+
+# Shelter set name -> shelter (lon, lat) coordinates, snapped to the nearest node
+DEFAULT_SHELTER_SETS = {
+    "default": [(121.1114449, 14.7017247), (121.109950, 14.697330)],
+}
+
+
+def scenario_grid(**axes):
+    """Every combination of the values given per scenario key, e.g. ``scenario_grid(rainfall=(1, 2))``.
+
+    Keys that are not given take their value from ``SCENARIO_DEFAULTS``.
+    """
+    unknown = set(axes) - set(SCENARIO_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown scenario keys: {sorted(unknown)!r}")
+    axes = {key: axes.get(key, (default,)) for key, default in SCENARIO_DEFAULTS.items()}
+    return [dict(zip(axes, values)) for values in itertools.product(*axes.values())]
+
+
+def check_hazard(hazard):
+    """``hazard`` as a level name or a float quantile, or ``ValueError`` if it is neither."""
+    if isinstance(hazard, str):
+        if hazard not in HAZARD_LEVELS:
+            raise ValueError(f"Unknown hazard: {hazard!r}")
+        return hazard
+    try:
+        q = float(hazard)
+    except TypeError:
+        raise ValueError(f"Unknown hazard: {hazard!r}") from None
+    if not 0.0 <= q <= 1.0:
+        raise ValueError(f"Hazard quantile must be in [0, 1], got {q!r}")
+    return q
+
+
+def edge_hazard(graph, hazard="Var_mean", rainfall=1.0):
+    """Per-edge flood risk for a hazard level or quantile, scaled by ``rainfall``."""
+    hazard = check_hazard(hazard)
+    if isinstance(hazard, str):
+        values = np.asarray(getattr(graph, HAZARD_LEVELS[hazard]), dtype=np.float64)
+    else:
+        values = graph.var_min + hazard * (graph.var_max.astype(np.float64) - graph.var_min)
+    return values * float(rainfall)
+
+
+def run_scenario(graph, scenario, shelters, until=3 * 3600.0):
+    """Metrics of one scenario on ``graph`` with ``shelters`` (node ids); ``graph`` is left untouched.
+
+    Besides the scenario itself and ``EvacuationSim.summary()`` the result has
+    ``unreachable_nodes`` (nodes with no open route to any shelter),
+    ``mean_route_risk`` / ``mean_route_length`` (sum of ``length * var_mean``
+    and of ``length`` along the evacuees' routes, over evacuees that have one)
+    and ``runtime_s``.
+    """
+    start = time.perf_counter()
+    scenario = {**SCENARIO_DEFAULTS, **scenario}
+    hazard = edge_hazard(graph, scenario["hazard"], scenario["rainfall"])
+    columns = {name: getattr(graph, name) for name in EDGE_COLUMNS}
+    columns["var_mean"] = hazard
+    columns["closed"] = graph.closed | (hazard >= scenario["close_above"])
+    g = RoadGraph(graph.lon, graph.lat, graph.offsets, graph.targets, **columns)
+
+    shelters = np.atleast_1d(np.asarray(shelters, dtype=np.int64))
+    routes = ShelterRoutes(g, shelters, profile=scenario["profile"])
+    dist, next_hop, nearest = routes.nearest_tree()
+    origins = np.random.default_rng(scenario["seed"]).integers(g.n_nodes, size=int(scenario["evacuees"]))
+    shelter_index = np.full(g.n_nodes, -1, dtype=np.int64)
+    shelter_index[shelters] = np.arange(len(shelters))
+    targets = np.where(nearest[origins] >= 0, shelter_index[np.maximum(nearest[origins], 0)], -1)
+    sim = EvacuationSim(g, origins, shelters, targets=targets, profile=scenario["profile"]).run(until)
+
+    routed = origins[np.isfinite(dist[origins])]
+    risk = tree_accumulate(g, next_hop, g.length * g.var_mean)[routed]
+    length = tree_accumulate(g, next_hop, g.length)[routed]
+    summary = sim.summary()
+    del summary["agents"]
+    return {
+        **scenario,
+        "hazard": str(scenario["hazard"]),
+        "unreachable_nodes": int((~np.isfinite(dist)).sum()),
+        "mean_route_risk": float(risk.mean()) if len(routed) else float("nan"),
+        "mean_route_length": float(length.mean()) if len(routed) else float("nan"),
+        **summary,
+        "runtime_s": time.perf_counter() - start,
+    }
+
+
+# Per-process state of sweep workers, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(directory, shelter_sets, until):
+    _worker["graph"] = load_graph(directory)
+    _worker["shelter_sets"] = shelter_sets
+    _worker["until"] = until
+
+
+def _run_worker(index, scenario):
+    shelters = _worker["shelter_sets"][scenario.get("shelters", SCENARIO_DEFAULTS["shelters"])]
+    return {"scenario": index, **run_scenario(_worker["graph"], scenario, shelters, _worker["until"])}
+
+
+def run_sweep(scenarios, out_path, shelter_sets=None, workers=None, path=DEFAULT_MAP_CSV, until=3 * 3600.0,
+              progress=None):
+    """Run ``scenarios`` on a pool of ``workers`` processes and stream one row each to ``out_path``.
+
+    Rows are written in completion order; the ``scenario`` column is the
+    position in ``scenarios``. ``progress`` is an optional callable invoked
+    with every finished row. Returns the number of rows written.
+    """
+    directory = artifact_dir(path)
+    graph = load_graph(directory)
+    shelter_sets = DEFAULT_SHELTER_SETS if shelter_sets is None else shelter_sets
+    snapped = {}
+    for name, coords in shelter_sets.items():
+        lon, lat = np.asarray(coords, dtype=np.float64).reshape(-1, 2).T
+        snapped[name] = np.unique(graph.snapper.nearest_node(lon, lat, max_distance=float("inf"))[0])
+    # Bad scenarios are rejected here rather than in a worker halfway through the run
+    for scenario in scenarios:
+        if scenario.get("shelters", SCENARIO_DEFAULTS["shelters"]) not in snapped:
+            raise ValueError(f"Unknown shelter set: {scenario['shelters']!r}")
+        check_hazard(scenario.get("hazard", SCENARIO_DEFAULTS["hazard"]))
+
+    writer = ResultWriter(out_path)
+    written = 0
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(directory, snapped, until)) as pool:
+            futures = [pool.submit(_run_worker, i, scenario) for i, scenario in enumerate(scenarios)]
+            for future in as_completed(futures):
+                row = future.result()
+                writer.write(row)
+                written += 1
+                if progress is not None:
+                    progress(row)
+    finally:
+        writer.close()
+    return written
+
+
+def _hazard_arg(value):
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _shelter_sets(values):
+    """Shelter sets for ``--shelters`` values: names from ``DEFAULT_SHELTER_SETS`` or ``LON,LAT;LON,LAT`` lists."""
+    sets = dict(DEFAULT_SHELTER_SETS)
+    for value in values:
+        if value not in sets:
+            try:
+                sets[value] = [parse_lonlat(pair) for pair in value.split(";") if pair.strip()]
+            except ValueError:
+                raise ValueError(f"Unknown shelter set: {value!r}") from None
+    return sets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a grid of evacuation scenarios in parallel.")
+    parser.add_argument("out", help="results file (.csv, or .parquet with pyarrow installed)")
+    parser.add_argument("--hazard", nargs="+", type=_hazard_arg, default=["Var_mean"],
+                        help="Var_min, Var_mean, Var_max or quantiles in [0, 1]")
+    parser.add_argument("--rainfall", nargs="+", type=float, default=[1.0])
+    parser.add_argument("--shelters", nargs="+", default=["default"],
+                        help="shelter set names, or shelter lists written as 'LON,LAT;LON,LAT'")
+    parser.add_argument("--profile", nargs="+", default=["length"], choices=["length", "risk"])
+    parser.add_argument("--evacuees", nargs="+", type=int, default=[1000])
+    parser.add_argument("--close-above", nargs="+", type=float, default=[float("inf")])
+    parser.add_argument("--seed", nargs="+", type=int, default=[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--until", type=float, default=3 * 3600.0, help="simulated seconds per scenario")
+    args = parser.parse_args(argv)
+    try:
+        shelter_sets = _shelter_sets(args.shelters)
+        for hazard in args.hazard:
+            check_hazard(hazard)
+    except ValueError as error:
+        parser.error(str(error))
+
+    scenarios = scenario_grid(hazard=args.hazard, rainfall=args.rainfall, shelters=args.shelters,
+                              profile=args.profile, evacuees=args.evacuees, close_above=args.close_above,
+                              seed=args.seed)
+    done = run_sweep(scenarios, args.out, shelter_sets, workers=args.workers, until=args.until,
+                     progress=lambda row: print(f"scenario {row['scenario']}: {row['runtime_s']:.2f}s"))
+    print(f"Wrote {done} scenarios to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
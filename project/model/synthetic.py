@@ -0,0 +1,135 @@
+"""Synthetic road networks in the ``preprocessed_Map.csv`` layout.
+
+:func:`grid_network` and :func:`radial_network` generate street grids and
+ring-and-spoke towns of a requested size (roughly ``n_edges`` directed graph
+edges once built with ``build_road_graph(df, k=0)``) with random hazard
+attributes, so every pipeline stage can be exercised from 10^2 to 10^6 edges
+without real data. Coordinates are placed around Bagong Silangan.
+"""
+import numpy as np
+
+from .distance import EARTH_RADIUS_M
+
+ORIGIN = (121.11, 14.70)
+
+# Highway classes the generators draw from; a subset of ``road_graph.HIGHWAY_CLASSES``
+SYNTHETIC_HIGHWAYS = ("residential", "service", "path", "footway", "tertiary", "secondary")
+
+
+def _to_lonlat(x, y, origin=ORIGIN):
+    """Local east/north metres around ``origin`` to ``(lon, lat)`` degrees."""
+    lat = origin[1] + np.degrees(y / EARTH_RADIUS_M)
+    lon = origin[0] + np.degrees(x / (EARTH_RADIUS_M * np.cos(np.radians(origin[1]))))
+    return lon, lat
+
+
+def _frame(lon, lat, vertices, offsets, rng):
+    """Road frame for polylines ``vertices[offsets[i]:offsets[i + 1]]`` over node coordinates."""
+    import pandas as pd
+    import shapely
+
+    counts = np.diff(offsets)
+    coords = np.column_stack([lon[vertices], lat[vertices]])
+    lines = shapely.linestrings(coords, indices=np.repeat(np.arange(len(counts)), counts))
+    wkt = shapely.to_wkt(lines, rounding_precision=7)
+    n = len(counts)
+    var_min = rng.integers(1, 4, n).astype(np.float64)
+    var_max = np.minimum(var_min + rng.integers(0, 2, n), 3.0)
+    first = vertices[offsets[:-1]]
+    return pd.DataFrame({
+        "WKT": wkt,
+        "geometry": wkt,
+        "highway": rng.choice(SYNTHETIC_HIGHWAYS, n),
+        "lanes": rng.integers(1, 3, n).astype(np.float64),
+        "surface_encoded": rng.integers(0, 6, n),
+        "Var_min": var_min,
+        "Var_max": var_max,
+        "Var_mean": var_min + rng.random(n) * (var_max - var_min),
+        "longitude": lon[first],
+        "latitude": lat[first],
+    })
+
+
+def _chunk(rows, blocks):
+    """Split each row of node ids into polylines of ``blocks`` segments sharing their end nodes."""
+    width = rows.shape[1]
+    pieces = [rows[:, start:min(start + blocks, width - 1) + 1] for start in range(0, width - 1, blocks)]
+    vertices = np.concatenate([piece.ravel() for piece in pieces])
+    counts = np.concatenate([np.full(len(rows), piece.shape[1]) for piece in pieces])
+    return vertices, np.concatenate([[0], np.cumsum(counts)])
+
+
+def grid_network(n_edges=10000, spacing=100.0, blocks=4, jitter=10.0, seed=0):
+    """Street grid of about ``n_edges`` directed edges; each road spans ``blocks`` blocks."""
+    rng = np.random.default_rng(seed)
+    # A side x side grid has 2 * side * (side - 1) block segments, i.e. twice as many edges
+    side = max(2, int(np.ceil(0.5 + np.sqrt(n_edges / 4.0 + 0.25))))
+    ids = np.arange(side * side).reshape(side, side)
+    x, y = np.meshgrid(np.arange(side) * spacing, np.arange(side) * spacing)
+    x = x.ravel() + rng.uniform(-jitter, jitter, side * side)
+    y = y.ravel() + rng.uniform(-jitter, jitter, side * side)
+    lon, lat = _to_lonlat(x - x.mean(), y - y.mean())
+    h_vertices, h_offsets = _chunk(ids, blocks)
+    v_vertices, v_offsets = _chunk(ids.T, blocks)
+    vertices = np.concatenate([h_vertices, v_vertices])
+    offsets = np.concatenate([h_offsets, h_offsets[-1] + v_offsets[1:]])
+    return _frame(lon, lat, vertices, offsets, rng)
+
+
+def radial_network(n_edges=10000, ring_spacing=150.0, arc_vertices=4, spokes=8, seed=0):
+    """Rings joined by spokes around a centre, about ``n_edges`` directed edges.
+
+    Ring ``i`` (at ``i * ring_spacing`` metres) carries ``spokes * 2**floor(log2(i))``
+    spokes, so the number of spokes doubles whenever the radius does and arcs
+    stay between about 0.8 and 1.6 ring spacings long, as in a town growing
+    outwards. Every ring is cut into one road per pair of neighbouring spokes
+    (with ``arc_vertices`` - 2 intermediate vertices following the arc) and
+    every spoke into one road per ring gap.
+    """
+    rng = np.random.default_rng(seed)
+    steps = arc_vertices - 1
+    # Ring i holds about 0.75 * spokes * i * arc_vertices segments with its spokes, twice that in edges
+    rings = max(1, int(round(np.sqrt(n_edges / (0.75 * spokes * arc_vertices)))))
+    per_ring = spokes * 2 ** np.floor(np.log2(np.arange(1, rings + 1))).astype(np.int64)
+    first = np.concatenate([[1], 1 + np.cumsum(per_ring * steps)])  # node 0 is the centre
+    ring = np.repeat(np.arange(rings), per_ring * steps)
+    position = np.arange(len(ring)) - (first[ring] - 1)
+    theta = 2 * np.pi * position / (per_ring[ring] * steps)
+    r = ring_spacing * (ring + 1 + rng.uniform(-0.05, 0.05, len(ring)))
+    lon, lat = _to_lonlat(np.append(0.0, r * np.cos(theta)), np.append(0.0, r * np.sin(theta)))
+
+    vertices, counts = [], []
+    for i in range(rings):
+        m = per_ring[i] * steps
+        # Arc roads: spoke k to spoke k + 1 (wrapping round)
+        cols = (np.arange(per_ring[i])[:, None] * steps + np.arange(steps + 1)[None, :]) % m
+        vertices.append((first[i] + cols).ravel())
+        counts.append(np.full(per_ring[i], steps + 1))
+        # Spoke roads from the previous ring (or the centre) to this one
+        if i == 0:
+            inner = np.zeros(per_ring[0], dtype=np.int64)
+            outer = first[0] + np.arange(per_ring[0]) * steps
+        else:
+            inner = first[i - 1] + np.arange(per_ring[i - 1]) * steps
+            outer = first[i] + np.arange(per_ring[i - 1]) * (per_ring[i] // per_ring[i - 1]) * steps
+        vertices.append(np.column_stack([inner, outer]).ravel())
+        counts.append(np.full(len(inner), 2))
+    vertices = np.concatenate(vertices)
+    offsets = np.concatenate([[0], np.cumsum(np.concatenate(counts))])
+    return _frame(lon, lat, vertices, offsets, rng)
+
+
+def hazard_points(roads, n_points=10000, seed=0):
+    """AEGIS-like flood points (``latitude``, ``longitude``, ``flood_heig``, ``elevation``, ``precipitat``) over ``roads``."""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    lon = rng.uniform(roads["longitude"].min(), roads["longitude"].max(), n_points)
+    lat = rng.uniform(roads["latitude"].min(), roads["latitude"].max(), n_points)
+    return pd.DataFrame({
+        "latitude": lat,
+        "longitude": lon,
+        "flood_heig": rng.integers(1, 4, n_points).astype(np.float64),
+        "elevation": rng.uniform(20, 80, n_points),
+        "precipitat": rng.uniform(0, 300, n_points),
+    })
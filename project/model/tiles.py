@@ -0,0 +1,260 @@
+"""Tiled on-disk store of the road graph and road geometry, loaded by bounding box.
+
+Space is cut into square tiles of ``tile_size`` degrees, numbered along a
+Z-order (Morton) curve. Graph nodes are renumbered in tile order, so the CSR
+arrays of one tile, and of neighbouring tiles, are contiguous on disk. Roads
+(geometry, hazard readings and other attributes) are stored once, in the
+order of the tile holding their first vertex, and indexed under every tile
+their bounding box covers. Every array is a memory-mapped ``.npy``
+file: loading a bounding box or a routing corridor reads the pages of the
+tiles it touches, so memory follows the query, not the region on disk.
+
+Nodes keep their store-wide ids across tiles. Loading several tiles stitches
+edges that cross tile borders back together. Edges leaving the loaded area
+are dropped, and their source nodes are reported as ``boundary``.
+
+::
+
+    python -m model.tiles data/final_data/tiles --tile-size 0.005
+"""
+import argparse
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from .graph_store import load_arrays, save_arrays
+from .road_graph import DEFAULT_MAP_CSV, EDGE_COLUMNS, RoadGraph
+
+TILE_VERSION = 3
+
+DEFAULT_TILE_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "data", "final_data", "tiles"))
+
+GRAPH_TILE_ARRAYS = ("lon", "lat", "offsets", "targets") + tuple(EDGE_COLUMNS) + ("tile_keys", "tile_nodes")
+ROAD_COLUMNS = ("Var_min", "Var_mean", "Var_max", "lanes", "surface_encoded", "highway")
+ROAD_TILE_ARRAYS = ("row", "xy", "offsets", "bbox", "tile_keys", "tile_roads", "tile_index") + ROAD_COLUMNS
+
+TileGraph = namedtuple("TileGraph", ["graph", "nodes", "boundary"])
+TileGraph.__doc__ = """Graph of the loaded tiles, the store-wide id of each of its nodes and the nodes with edges leaving it."""
+
+
+def _spread(v):
+    """Bits of 32-bit ``v`` moved to the even positions of a 64-bit integer."""
+    v = np.asarray(v, dtype=np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def morton(ix, iy):
+    """Z-order key of tile column ``ix`` and row ``iy``."""
+    return (_spread(ix) | (_spread(iy) << np.uint64(1))).astype(np.int64)
+
+
+def build_tile_store(directory=DEFAULT_TILE_DIR, graph=None, path=DEFAULT_MAP_CSV, tile_size=0.005, chunksize=10000):
+    """Write the tile store of ``graph`` (default: the artifact graph of ``path``) and the roads in ``path``.
+
+    Returns the directory.
+    """
+    import pandas as pd
+    import shapely
+
+    from .graph_store import open_road_graph
+    from .road_graph import highway_codes
+
+    if graph is None:
+        graph = open_road_graph(path)
+    os.makedirs(directory, exist_ok=True)
+    lon0, lat0 = float(np.floor(graph.lon.min() / tile_size) * tile_size), float(np.floor(graph.lat.min() / tile_size) * tile_size)
+
+    def keys(lon, lat):
+        # Anything west or south of the graph goes into the edge tiles
+        return morton(np.maximum(np.floor((lon - lon0) / tile_size), 0), np.maximum(np.floor((lat - lat0) / tile_size), 0))
+
+    # Graph: nodes renumbered in tile order, edges follow their source node
+    node_key = keys(graph.lon, graph.lat)
+    order = np.argsort(node_key, kind="stable")
+    new_id = np.empty(graph.n_nodes, dtype=np.int64)
+    new_id[order] = np.arange(graph.n_nodes)
+    tiled = RoadGraph.from_edges(
+        graph.lon[order], graph.lat[order], new_id[graph.sources], new_id[graph.targets],
+        **{name: getattr(graph, name) for name in EDGE_COLUMNS},
+    )
+    tile_keys, first = np.unique(node_key[order], return_index=True)
+    arrays = {name: getattr(tiled, name) for name in ("lon", "lat", "offsets", "targets") + tuple(EDGE_COLUMNS)}
+    arrays.update(tile_keys=tile_keys, tile_nodes=np.append(first, graph.n_nodes))
+    save_arrays(directory, arrays, prefix="graph_")
+
+    # Roads, read in chunks and ordered by the tile of their first vertex
+    parts = []
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        geoms = shapely.from_wkt(chunk["geometry"].to_numpy(), on_invalid="ignore")
+        xy, line = shapely.get_coordinates(geoms, return_index=True)
+        counts = np.bincount(line, minlength=len(chunk))
+        # Rows without a geometry are left out
+        has_xy = counts > 0
+        first_xy = xy[np.concatenate([[0], np.cumsum(counts)[:-1]])[has_xy]]
+        columns = {name: chunk[name].to_numpy(dtype=np.float32)[has_xy] for name in ROAD_COLUMNS if name != "highway"}
+        columns["highway"] = highway_codes(chunk["highway"])[has_xy]
+        parts.append({
+            "row": chunk.index.to_numpy(dtype=np.int64)[has_xy], "xy": xy, "counts": counts[has_xy],
+            "bbox": shapely.bounds(geoms)[has_xy], "key": keys(first_xy[:, 0], first_xy[:, 1]), **columns,
+        })
+    roads = {name: np.concatenate([p[name] for p in parts]) for name in parts[0] if name != "xy"}
+    xy = np.concatenate([p["xy"] for p in parts])
+    road_order = np.argsort(roads["key"], kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(roads["counts"])])
+    counts = roads["counts"][road_order]
+    take = np.repeat(offsets[:-1][road_order], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    bbox = roads["bbox"][road_order]
+    # Each road is indexed under every tile of its bounding box, so a query only reads the tiles it overlaps
+    x0, x1 = (np.maximum(np.floor((bbox[:, c] - lon0) / tile_size), 0).astype(np.int64) for c in (0, 2))
+    y0, y1 = (np.maximum(np.floor((bbox[:, c] - lat0) / tile_size), 0).astype(np.int64) for c in (1, 3))
+    width = x1 - x0 + 1
+    spans = width * (y1 - y0 + 1)
+    road = np.repeat(np.arange(len(bbox)), spans)
+    j = np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+    tile_key = morton(x0[road] + j % width[road], y0[road] + j // width[road])
+    index_order = np.lexsort((road, tile_key))
+    road_keys, road_first = np.unique(tile_key[index_order], return_index=True)
+    arrays = {name: roads[name][road_order] for name in ("row",) + ROAD_COLUMNS}
+    arrays.update(bbox=bbox, xy=xy[take], offsets=np.concatenate([[0], np.cumsum(counts)]), tile_keys=road_keys,
+                  tile_roads=np.append(road_first, len(index_order)), tile_index=road[index_order])
+    save_arrays(directory, arrays, prefix="roads_")
+
+    # Tile columns and rows in use, so queries never enumerate tiles beyond the data
+    n_cols = int(max(np.floor((graph.lon.max() - lon0) / tile_size), x1.max(initial=0))) + 1
+    n_rows = int(max(np.floor((graph.lat.max() - lat0) / tile_size), y1.max(initial=0))) + 1
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump({"version": TILE_VERSION, "tile_size": tile_size, "lon0": lon0, "lat0": lat0,
+                   "n_cols": n_cols, "n_rows": n_rows, "source": os.path.basename(path)}, f, indent=2)
+    return directory
+
+
+class TileStore:
+    """Read side of a tile store; arrays stay memory-mapped and tiles are sliced out on demand."""
+
+    def __init__(self, directory=DEFAULT_TILE_DIR):
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != TILE_VERSION:
+            raise ValueError(f"Tile store {directory} has version {meta.get('version')}, expected {TILE_VERSION}")
+        self.directory = directory
+        self.meta = meta
+        self.tile_size, self.lon0, self.lat0 = meta["tile_size"], meta["lon0"], meta["lat0"]
+        self.n_cols, self.n_rows = meta["n_cols"], meta["n_rows"]
+        self._graph = load_arrays(directory, GRAPH_TILE_ARRAYS, prefix="graph_")
+        self._roads = load_arrays(directory, ROAD_TILE_ARRAYS, prefix="roads_")
+
+    def _grid(self, min_lon, min_lat, max_lon, max_lat):
+        """Columns and rows of the stored extent's tiles overlapping a box, as flat arrays."""
+        x0, x1 = np.floor((np.array([min_lon, max_lon]) - self.lon0) / self.tile_size)
+        y0, y1 = np.floor((np.array([min_lat, max_lat]) - self.lat0) / self.tile_size)
+        ix, iy = np.meshgrid(np.arange(max(x0, 0), min(x1, self.n_cols - 1) + 1),
+                             np.arange(max(y0, 0), min(y1, self.n_rows - 1) + 1))
+        return ix.ravel(), iy.ravel()
+
+    def tiles(self, bbox):
+        """Morton keys of the tiles overlapping ``(min_lon, min_lat, max_lon, max_lat)``."""
+        return np.unique(morton(*self._grid(*bbox)))
+
+    def corridor_tiles(self, lon, lat, margin=500.0):
+        """Morton keys of the tiles within ``margin`` metres of the polyline through ``lon``/``lat``."""
+        from .distance import EARTH_RADIUS_M
+
+        lon, lat = np.atleast_1d(np.asarray(lon, dtype=np.float64)), np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        ky = EARTH_RADIUS_M * np.pi / 180
+        kx = ky * np.cos(np.radians(lat.mean()))
+        pad_lon, pad_lat = margin / kx, margin / ky
+        ix, iy = self._grid(lon.min() - pad_lon, lat.min() - pad_lat, lon.max() + pad_lon, lat.max() + pad_lat)
+        # Tile centres against every polyline segment, in local metres
+        cx = (self.lon0 + (ix + 0.5) * self.tile_size) * kx
+        cy = (self.lat0 + (iy + 0.5) * self.tile_size) * ky
+        px, py = lon * kx, lat * ky
+        ax, ay = px[:-1] if len(px) > 1 else px, py[:-1] if len(py) > 1 else py
+        bx, by = px[1:] if len(px) > 1 else px, py[1:] if len(py) > 1 else py
+        dx, dy = bx - ax, by - ay
+        length2 = np.maximum(dx * dx + dy * dy, 1e-12)
+        t = np.clip(((cx[:, None] - ax) * dx + (cy[:, None] - ay) * dy) / length2, 0.0, 1.0)
+        dist = np.hypot(cx[:, None] - (ax + t * dx), cy[:, None] - (ay + t * dy)).min(axis=1)
+        half_diagonal = np.hypot(self.tile_size * kx, self.tile_size * ky) / 2
+        keep = dist <= margin + half_diagonal
+        return np.unique(morton(ix[keep], iy[keep]))
+
+    def _ranges(self, keys, tile_keys, tile_offsets):
+        """``(start, stop)`` item ranges of the stored tiles among ``keys``."""
+        pos = np.searchsorted(tile_keys, keys)
+        found = pos < len(tile_keys)
+        found[found] = tile_keys[pos[found]] == keys[found]
+        pos = pos[found]
+        return np.asarray(tile_offsets[pos]), np.asarray(tile_offsets[pos + 1])
+
+    def load_tiles(self, keys):
+        """:data:`TileGraph` of the tiles ``keys``, with edges between them stitched together."""
+        g = self._graph
+        # Sorted, distinct keys give sorted node ids, which the target lookup below relies on
+        keys = np.unique(np.asarray(keys, dtype=np.int64))
+        starts, stops = self._ranges(keys, g["tile_keys"], g["tile_nodes"])
+        nodes = np.concatenate([np.arange(a, b) for a, b in zip(starts.tolist(), stops.tolist())] or [np.empty(0, np.int64)])
+        offsets = np.asarray(g["offsets"])
+        edge_starts, edge_stops = offsets[starts], offsets[stops]
+        edges = np.concatenate([np.arange(a, b) for a, b in zip(edge_starts.tolist(), edge_stops.tolist())]
+                               or [np.empty(0, np.int64)])
+        degree = np.asarray(offsets[nodes + 1] - offsets[nodes])
+        sources = np.repeat(np.arange(len(nodes)), degree)
+        targets = np.asarray(g["targets"][edges], dtype=np.int64)
+        local = np.searchsorted(nodes, targets)
+        inside = local < len(nodes)
+        inside[inside] = nodes[local[inside]] == targets[inside]
+        boundary = np.unique(sources[~inside])
+        kept = np.bincount(sources[inside], minlength=len(nodes))
+        columns = {name: np.asarray(g[name][edges])[inside] for name in EDGE_COLUMNS}
+        graph = RoadGraph(np.asarray(g["lon"][nodes]), np.asarray(g["lat"][nodes]),
+                          np.concatenate([[0], np.cumsum(kept)]), local[inside], **columns)
+        return TileGraph(graph, nodes, boundary)
+
+    def load_bbox(self, bbox):
+        """:data:`TileGraph` of the tiles overlapping ``(min_lon, min_lat, max_lon, max_lat)``."""
+        return self.load_tiles(self.tiles(bbox))
+
+    def load_corridor(self, lon, lat, margin=500.0):
+        """:data:`TileGraph` of the tiles within ``margin`` metres of the polyline through ``lon``/``lat``."""
+        return self.load_tiles(self.corridor_tiles(lon, lat, margin))
+
+    def roads(self, bbox):
+        """Roads whose bounding box overlaps ``bbox``, as a frame with ``WKT``, ``row`` and the road columns."""
+        import pandas as pd
+        import shapely
+
+        r = self._roads
+        starts, stops = self._ranges(self.tiles(bbox), r["tile_keys"], r["tile_roads"])
+        rows = np.unique(np.concatenate([r["tile_index"][a:b] for a, b in zip(starts.tolist(), stops.tolist())]
+                                        or [np.empty(0, np.int64)]))
+        box = np.asarray(r["bbox"][rows])
+        overlap = (box[:, 0] <= bbox[2]) & (box[:, 2] >= bbox[0]) & (box[:, 1] <= bbox[3]) & (box[:, 3] >= bbox[1])
+        rows = rows[overlap]
+        offsets = np.asarray(r["offsets"])
+        counts = offsets[rows + 1] - offsets[rows]
+        take = np.repeat(offsets[rows], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        lines = shapely.linestrings(np.asarray(r["xy"][take]), indices=np.repeat(np.arange(len(rows)), counts))
+        frame = pd.DataFrame({"row": np.asarray(r["row"][rows]), "WKT": shapely.to_wkt(lines, rounding_precision=-1)})
+        for name in ROAD_COLUMNS:
+            frame[name] = np.asarray(r[name][rows])
+        return frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the tiled road store.")
+    parser.add_argument("directory", nargs="?", default=DEFAULT_TILE_DIR)
+    parser.add_argument("--csv", default=DEFAULT_MAP_CSV, help="preprocessed_Map.csv-style roads file")
+    parser.add_argument("--tile-size", type=float, default=0.005, help="tile edge in degrees")
+    args = parser.parse_args(argv)
+    directory = build_tile_store(args.directory, path=args.csv, tile_size=args.tile_size)
+    store = TileStore(directory)
+    print(f"Wrote {len(store._graph['tile_keys'])} graph tiles and {len(store._roads['row'])} roads to {directory}")
+
+
+if __name__ == "__main__":
+    main()
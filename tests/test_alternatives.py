@@ -0,0 +1,56 @@
+import itertools
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from project.model.alternatives import METHODS, AlternativeRoutes
+from project.model.road_graph import build_road_graph
+from project.model.synthetic import grid_network
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return build_road_graph(grid_network(5000, seed=0), k=0)
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_trivial_route_is_the_same_for_every_method(graph, method):
+    routes = AlternativeRoutes(graph).routes(7, 7, k=3, method=method)
+    assert [r.path for r in routes] == [[7]]
+    assert routes[0].cost == routes[0].length == 0.0
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_routes_respect_overlap_and_stretch(graph, method):
+    alternatives = AlternativeRoutes(graph, max_overlap=0.6, max_stretch=1.5)
+    rng = np.random.default_rng(1)
+    for source, target in rng.integers(graph.n_nodes, size=(5, 2)).tolist():
+        routes = alternatives.routes(source, target, k=4, method=method)
+        # Every method finds the full k on this grid at these settings
+        assert len(routes) == 4
+        assert all(r.path[0] == source and r.path[-1] == target for r in routes)
+        assert all(r.overlap <= 0.6 and r.cost <= 1.5 * routes[0].cost * (1 + 1e-9) for r in routes)
+
+
+def test_reverse_trees_are_capped(graph):
+    alternatives = AlternativeRoutes(graph, max_trees=3)
+    for target in range(10):
+        alternatives.routes(20, target, k=2)
+    assert list(alternatives._trees) == [7, 8, 9]
+
+
+def test_yen_matches_networkx_k_shortest_paths():
+    graph = build_road_graph(grid_network(400, seed=3), k=0)
+    reference = nx.DiGraph()
+    reference.add_weighted_edges_from(zip(graph.sources.tolist(), graph.targets.tolist(), graph.length.tolist()))
+    alternatives = AlternativeRoutes(graph, max_overlap=0.6, max_stretch=1.5)
+    k = 3
+    rng = np.random.default_rng(2)
+    for source, target in rng.integers(graph.n_nodes, size=(8, 2)).tolist():
+        routes = alternatives.routes(source, target, k=k, method="yen")
+        # The same overlap and stretch filter over the exact enumeration, capped at 10 * k paths like Yen's
+        exact = itertools.islice(nx.shortest_simple_paths(reference, source, target, weight="weight"), 10 * k)
+        expected = alternatives._select(exact, k, nx.dijkstra_path_length(reference, source, target), ordered=True)
+        assert [r.path for r in routes] == [r.path for r in expected]
+        assert np.allclose([r.cost for r in routes], [r.cost for r in expected])
@@ -0,0 +1,54 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from project.model.assignment import TrafficAssignment
+from project.model.road_graph import HIGHWAY_CLASSES, RoadGraph
+
+
+def _two_routes():
+    """Origin 0 to shelter 3 via node 1 (short, one lane) or node 2 (longer, two lanes)."""
+    src, dst = [0, 1, 0, 2], [1, 3, 2, 3]
+    return RoadGraph.from_edges(
+        [0.0, 0.001, 0.001, 0.002], [0.0, 0.001, -0.001, 0.0], src, dst,
+        length=np.array([300.0, 300.0, 450.0, 450.0]), lanes=np.array([1.0, 1.0, 2.0, 2.0]),
+        highway=np.full(4, HIGHWAY_CLASSES.index("residential")),
+    )
+
+
+@pytest.mark.parametrize("method", ["fw", "cfw"])
+def test_two_route_equilibrium_equalises_route_times(method):
+    graph = _two_routes()
+    a = TrafficAssignment(graph, [0], [3000.0], [3]).run(max_iter=500, tol=1e-6, method=method)
+    assert a.converged
+    via = {node: graph.edge_ids([0, node], [node, 3]) for node in (1, 2)}
+    volume = {node: a.volume[edges] for node, edges in via.items()}
+    times = {node: a.time[edges].sum() for node, edges in via.items()}
+    # Both routes carry flow, conserved along each route and in total
+    assert all(v[0] > 0 and np.isclose(v[0], v[1]) for v in volume.values())
+    assert np.isclose(volume[1][0] + volume[2][0], 3000.0)
+    assert np.isclose(times[1], times[2], rtol=1e-3)
+
+
+def test_stopping_at_max_iter_is_reported():
+    a = TrafficAssignment(_two_routes(), [0], [3000.0], [3])
+    with pytest.warns(RuntimeWarning, match="stopped after 2 iterations"):
+        a.run(max_iter=2, tol=1e-12)
+    assert not a.converged
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        a.run(max_iter=500, tol=1e-3)
+    assert a.converged
+
+
+def test_closed_edges_carry_no_flow_and_raise_no_warnings():
+    graph = _two_routes()
+    graph.update_edges(graph.edge_ids([0], [1]), closed=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for method in ("fw", "cfw"):
+            a = TrafficAssignment(graph, [0], [3000.0], [3]).run(max_iter=50, method=method)
+            assert a.converged
+            assert a.volume[graph.edge_ids([0, 1], [1, 3])].tolist() == [0.0, 0.0]
+            assert np.allclose(a.volume[graph.edge_ids([0, 2], [2, 3])], 3000.0)
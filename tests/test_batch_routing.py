@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from project.model.batch_routing import route_file
+from project.model.graph_store import open_road_graph
+
+
+def test_unsnappable_rows_do_not_abort_the_run(tmp_path):
+    graph = open_road_graph()
+    lon, lat = graph.coords([10, 200])
+    rows = pd.DataFrame({
+        "id": ["a", "nan", "blank", "text", "b"],
+        "origin_lon": [str(lon[0]), "nan", "", "east", str(lon[1])],
+        "origin_lat": [str(lat[0]), "nan", "", "north", str(lat[1])],
+    })
+    rows.to_csv(tmp_path / "origins.csv", index=False)
+    written = route_file(str(tmp_path / "origins.csv"), str(tmp_path / "routes.csv"), workers=1, chunksize=2)
+    assert written == 5
+
+    routes = pd.read_csv(tmp_path / "routes.csv", keep_default_na=False).set_index("id")
+    assert routes.loc[["nan", "blank", "text"], "origin"].tolist() == [-1, -1, -1]
+    assert np.isinf(routes.loc[["nan", "blank", "text"], "snap_m"].astype(float)).all()
+    assert routes.loc[["a", "b"], "origin"].tolist() == [10, 200]
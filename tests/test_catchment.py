@@ -0,0 +1,37 @@
+import numpy as np
+
+from project.model.catchment import Catchments
+from project.model.graph_store import open_road_graph
+from project.model.road_graph import RoadGraph
+
+
+def test_add_and_remove_match_a_full_recompute():
+    graph = open_road_graph()
+    rng = np.random.default_rng(0)
+    shelters = rng.choice(graph.n_nodes, size=6, replace=False).tolist()
+    catchments = Catchments(graph, shelters[:4])
+    for change, node in (("add", shelters[4]), ("remove", shelters[1]), ("add", shelters[5]), ("remove", shelters[4])):
+        getattr(catchments, f"{change}_shelter")(node)
+        fresh = Catchments(graph, catchments.shelters)
+        assert np.allclose(catchments.cost, fresh.cost)
+        # Ties may pick a different shelter, never a different cost
+        reachable = np.isfinite(fresh.cost)
+        assert (catchments.shelter[~reachable] == -1).all()
+        assert np.isin(catchments.shelter[reachable], catchments.shelters).all()
+        # Next hops lead to the assigned shelter at the assigned cost
+        hop = catchments.next_hop[reachable]
+        served = np.flatnonzero(reachable)
+        inner = hop >= 0
+        assert (catchments.shelter[hop[inner]] == catchments.shelter[served[inner]]).all()
+        assert (np.isin(served[~inner], catchments.shelters)).all()
+
+
+def test_point_at_the_end_of_a_closed_road_takes_the_node_cost():
+    # 0 -- 1 -- 2 (shelter) with 0 -- 1 closed; the point lies just past node 1 on the 0 -- 1 side
+    graph = RoadGraph.from_edges([0.0, 0.001, 0.001], [0.0, 0.0, 0.001], [0, 1, 1, 2], [1, 0, 2, 1],
+                                 length=np.array([110.0, 110.0, 110.0, 110.0]))
+    graph.update_edges(graph.edge_ids([0, 1], [1, 0]), closed=True)
+    snap = graph.snapper.nearest_edge(0.0011, -0.0001, max_distance=100)
+    assert graph.sources[snap.edge] in (0, 1) and graph.targets[snap.edge] in (0, 1)
+    cost, shelter = Catchments(graph, [2]).at(0.0011, -0.0001, max_distance=100)
+    assert cost.tolist() == [110.0] and shelter.tolist() == [2]
@@ -0,0 +1,42 @@
+import numpy as np
+
+from project.model.distance import polyline_length
+from project.model.noding import node_lines
+
+# About 10 m per 0.0001 degrees near the study area
+LON, LAT, D = 121.1, 14.68, 0.0001
+
+
+def _wkt(*points):
+    return "LINESTRING (" + ", ".join(f"{LON + x * D} {LAT + y * D}" for x, y in points) + ")"
+
+
+def _total_length(wkt):
+    import shapely
+
+    xy, line = shapely.get_coordinates(shapely.from_wkt(np.asarray(wkt, dtype=object)), return_index=True)
+    return polyline_length(xy, line, n_lines=len(wkt)).sum()
+
+
+def test_crossing_roads_split_at_intersection():
+    wkt = [_wkt((0, 0), (10, 0)), _wkt((5, -5), (5, 5))]
+    net = node_lines(wkt)
+    assert net.summary() == {"nodes": 5, "edges": 4, "splits": 2, "dangles": 4}
+    assert np.isclose(net.length.sum(), _total_length(wkt), rtol=1e-6)
+
+
+def test_standalone_roundabout_is_kept():
+    wkt = [_wkt((0, 0), (4, 0), (6, 2), (6, 4), (4, 6), (0, 6), (-2, 4), (0, 0))]
+    net = node_lines(wkt)
+    assert net.n_edges == 3
+    assert (net.src != net.dst).all()
+    assert len(net.dangles) == 0
+    assert np.isclose(net.length.sum(), _total_length(wkt), rtol=1e-6)
+
+
+def test_roundabout_attached_at_its_start_vertex_is_kept():
+    wkt = [_wkt((0, 0), (5, 0), (5, 5), (0, 5), (0, 0)), _wkt((-10, 0), (0, 0))]
+    net = node_lines(wkt)
+    assert net.n_edges == 4
+    assert (net.road == 0).sum() == 3
+    assert np.isclose(net.length.sum(), _total_length(wkt), rtol=1e-6)
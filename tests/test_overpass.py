@@ -0,0 +1,92 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from project.model.overpass import OverpassFetcher
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Overpass stand-in: one way per requested id, with configurable failures."""
+
+    def do_POST(self):
+        server = self.server
+        query = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())["data"][0]
+        ids = [int(i) for i in re.search(r"way\(id:([\d,]+)\)", query).group(1).split(",")]
+        with server.lock:
+            server.requests.append(ids)
+            flaky = [i for i in ids if i in server.flaky]
+            server.flaky.difference_update(flaky)
+        if flaky:
+            status, body = 503, {}
+        elif any(i in server.broken for i in ids):
+            status, body = 400, {}
+        else:
+            status, body = 200, {"elements": [
+                {"type": "way", "id": i, "geometry": [{"lon": 121.0 + i, "lat": 14.0}, {"lon": 121.0 + i, "lat": 14.1}]}
+                for i in ids
+            ]}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.lock = threading.Lock()
+    server.requests, server.flaky, server.broken = [], set(), set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _fetcher(server, tmp_path, **options):
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/interpreter"
+    return OverpassFetcher(url, cache_dir=str(tmp_path), batch_size=2, min_interval=0.0, **options)
+
+
+def test_batches_ids_and_parses_geometry(server, tmp_path):
+    geometries = _fetcher(server, tmp_path).fetch_ways(["way/5", "way/1", 3, "way/2", "way/4", "way/1"])
+    assert sorted(map(sorted, server.requests)) == [[1, 2], [3, 4], [5]]
+    assert sorted(geometries) == [1, 2, 3, 4, 5]
+    assert geometries[3] == [(124.0, 14.0), (124.0, 14.1)]
+
+
+def test_retries_a_failed_request(server, tmp_path):
+    server.flaky = {3}
+    fetcher = _fetcher(server, tmp_path)
+    assert sorted(fetcher.fetch_ways([1, 2, 3, 4])) == [1, 2, 3, 4]
+    assert sum(3 in ids for ids in server.requests) == 2
+    assert fetcher.failed == []
+
+
+def test_failed_batch_keeps_the_others(server, tmp_path):
+    server.broken = {3}
+    fetcher = _fetcher(server, tmp_path)
+    assert sorted(fetcher.fetch_ways([1, 2, 3, 4, 5])) == [1, 2, 5]
+    assert fetcher.failed == [3, 4]
+    # Failures are not cached, so a later run asks again
+    server.broken = set()
+    assert sorted(fetcher.fetch_ways([1, 2, 3, 4, 5])) == [1, 2, 3, 4, 5]
+    assert fetcher.failed == []
+
+
+def test_cache_hit_within_ttl(server, tmp_path):
+    _fetcher(server, tmp_path).fetch_ways([1, 2, 3])
+    assert len(server.requests) == 2
+    assert sorted(_fetcher(server, tmp_path).fetch_ways([1, 2, 3])) == [1, 2, 3]
+    assert len(server.requests) == 2
+    _fetcher(server, tmp_path, ttl=-1).fetch_ways([1, 2, 3])
+    assert len(server.requests) == 4
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from project.model.road_graph import build_road_graph
+from project.model.routing import ShelterRoutes
+from project.model.synthetic import grid_network
+
+
+def _assert_tree_matches(graph, weights, tree, fresh, root=None, shelters=None):
+    dist, next_hop = tree
+    assert np.allclose(dist, fresh[0], rtol=1e-9, atol=1e-6)
+    reachable = np.isfinite(dist)
+    assert (next_hop[~reachable] == -9999).all()
+    # Ties may pick another next hop, never one that breaks the distances
+    inner = np.flatnonzero(reachable & (next_hop >= 0))
+    edges = graph.edge_ids(inner, next_hop[inner])
+    assert (edges >= 0).all()
+    assert np.allclose(dist[inner], weights[edges] + dist[next_hop[inner]], rtol=1e-9, atol=1e-6)
+    if root is not None:
+        assert (root[~reachable] == -1).all()
+        assert (root[inner] == root[next_hop[inner]]).all()
+        assert np.isin(root[reachable], shelters).all()
+
+
+@pytest.mark.parametrize("profile", ["length", "risk"])
+def test_repair_after_random_updates_matches_fresh_search(profile):
+    graph = build_road_graph(grid_network(3000, seed=0), k=0)
+    rng = np.random.default_rng(0)
+    shelters = rng.choice(graph.n_nodes, size=4, replace=False).tolist()
+    routes = ShelterRoutes(graph, shelters, profile)
+    trees = {s: routes.tree(s) for s in shelters[:2]}
+    nearest = routes.nearest_tree()
+    var_mean = graph.var_mean.astype(np.float64)
+    for step in range(12):
+        edges = rng.choice(graph.n_edges, size=40, replace=False)
+        if step % 3 == 0:
+            routes.update_edges(edges, var_mean=var_mean[edges] * rng.uniform(1.5, 4.0, len(edges)))
+        elif step % 3 == 1:
+            routes.update_edges(edges, var_mean=var_mean[edges] * rng.uniform(0.1, 0.7, len(edges)))
+        else:
+            routes.close_edges(edges[:20])
+            routes.close_edges(np.flatnonzero(graph.closed)[:10], closed=False)
+        weights = graph.edge_weights(profile)
+        fresh = ShelterRoutes(graph, shelters, profile)
+        for s, tree in trees.items():
+            # Repaired in place, not rebuilt
+            assert routes.tree(s) is tree
+            _assert_tree_matches(graph, weights, tree, fresh.tree(s))
+        assert routes.nearest_tree() is nearest
+        _assert_tree_matches(graph, weights, nearest[:2], fresh.nearest_tree()[:2], nearest[2], shelters)
+        var_mean = graph.var_mean.astype(np.float64)
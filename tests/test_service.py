@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from project.model.graph_store import open_road_graph
+from project.model.routing import ShelterRoutes
+from project.model.service import RequestError, RoutingService
+
+
+@pytest.fixture
+def service():
+    service = RoutingService(open_road_graph(), workers=2)
+    yield service
+    service.close()
+
+
+def _request(service, raw):
+    async def run():
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return response
+
+    head, _, body = asyncio.run(run()).partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def _dispatch(service, method, target, body=None):
+    return asyncio.run(service._dispatch(method, target, body and json.dumps(body).encode()))
+
+
+def test_hazard_update_repairs_trees_instead_of_rebuilding(service):
+    graph = service.graph
+    origins = np.random.default_rng(0).integers(graph.n_nodes, size=20)
+    lon, lat = graph.coords(origins)
+    queries = [f"/route?lon={x}&lat={y}&profile=" for x, y in zip(lon.tolist(), lat.tolist())]
+    for profile in ("length", "risk"):
+        for query in queries:
+            _dispatch(service, "GET", query + profile)
+    before = {profile: service._routes[profile] for profile in ("length", "risk")}
+    dist = before["risk"].nearest_tree()[0]
+    saved = dist.copy()
+    edges = np.flatnonzero(np.isfinite(graph.length))[:50]
+    version = graph.version
+    reply = _dispatch(service, "POST", "/hazard", {"edges": edges.tolist(), "var_mean": [5.0] * len(edges)})
+    assert reply == {"version": version + 1}
+    for profile, cost in (("length", "metres"), ("risk", "risk")):
+        routes = service._routes[profile]
+        assert routes is not before[profile]
+        assert routes._nearest is not None and routes._version == graph.version
+        fresh = ShelterRoutes(graph, service.shelters, profile).nearest_tree()[0]
+        for query in queries:
+            result = _dispatch(service, "GET", query + profile)
+            assert result["version"] == graph.version
+            expected = fresh[result["origin"]]
+            if np.isfinite(expected):
+                assert result[cost] == pytest.approx(expected, rel=1e-9)
+            else:
+                assert result["nodes"] is None
+    # Searches already running on the old trees still see them unchanged
+    assert np.array_equal(dist, saved)
+
+
+@pytest.mark.parametrize("body", [
+    {"edges": [0, 1], "var_mean": [9, 9], "lanes": [1, 2, 3]},
+    {"edges": [0, 1], "var_mean": [9, 9], "no_such_column": [1, 2]},
+    {"edges": [-1], "closed": [True]},
+    {"edges": [0.5], "closed": [True]},
+])
+def test_rejected_hazard_update_changes_nothing(service, body):
+    graph = service.graph
+    columns = {name: getattr(graph, name).copy() for name in ("var_mean", "lanes", "closed")}
+    version = graph.version
+    with pytest.raises(RequestError):
+        _dispatch(service, "POST", "/hazard", body)
+    assert graph.version == version
+    for name, column in columns.items():
+        assert np.array_equal(getattr(graph, name), column)
+
+
+def test_unexpected_errors_are_answered_with_500(service):
+    service.status = lambda: 1 / 0
+    status, payload = _request(service, b"GET /status HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert status == 500
+    assert "ZeroDivisionError" in payload["error"]
+
+
+def test_bad_hazard_body_is_a_client_error(service):
+    body = json.dumps({"edges": [0], "var_mean": {"not": "a number"}}).encode()
+    status, _ = _request(service, b"POST /hazard HTTP/1.1\r\nConnection: close\r\nContent-Length: "
+                         + str(len(body)).encode() + b"\r\n\r\n" + body)
+    assert status == 400
@@ -0,0 +1,21 @@
+import numpy as np
+
+from project.model.road_graph import build_road_graph
+from project.model.synthetic import grid_network
+
+
+def test_non_finite_points_snap_to_nothing():
+    graph = build_road_graph(grid_network(2000, seed=0), k=0)
+    snapper = graph.snapper
+    lon, lat = graph.coords([3, 40, 100])
+    lon = np.concatenate([lon, [np.nan, np.inf, lon[0]]])
+    lat = np.concatenate([lat, [lat[0], lat[0], -np.inf]])
+
+    nodes, dist = snapper.k_nearest_nodes(lon, lat, k=2)
+    assert nodes[:3, 0].tolist() == [3, 40, 100]
+    assert (nodes[3:] == -1).all() and np.isinf(dist[3:]).all()
+    assert snapper.nearest_node(np.nan, np.nan) == (-1, np.inf)
+
+    snap = snapper.nearest_edge(lon, lat)
+    assert (snap.edge[:3] >= 0).all()
+    assert (snap.edge[3:] == -1).all() and np.isinf(snap.distance[3:]).all()
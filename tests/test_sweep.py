@@ -0,0 +1,18 @@
+import pytest
+
+from project.model.sweep import main, run_sweep, scenario_grid
+
+
+@pytest.mark.parametrize("hazard", ["Var_median", 1.5, -0.1])
+def test_bad_hazard_is_rejected_before_any_scenario_runs(tmp_path, hazard):
+    out = tmp_path / "sweep.csv"
+    with pytest.raises(ValueError):
+        run_sweep(scenario_grid(hazard=["Var_mean", hazard]), str(out), workers=1)
+    assert not out.exists()
+
+
+def test_bad_hazard_is_a_usage_error(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main([str(tmp_path / "sweep.csv"), "--hazard", "0.5", "Var_median"])
+    assert exit_info.value.code == 2
+    assert "Unknown hazard: 'Var_median'" in capsys.readouterr().err
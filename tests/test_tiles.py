@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from project.model.tiles import TileStore, build_tile_store
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    return TileStore(build_tile_store(str(tmp_path_factory.mktemp("tiles")), tile_size=0.002))
+
+
+def _edges(tile_graph):
+    g = tile_graph.graph
+    return set(zip(tile_graph.nodes[g.sources].tolist(), tile_graph.nodes[g.targets].tolist()))
+
+
+def test_load_tiles_matches_full_subgraph_for_unsorted_duplicate_keys(store):
+    full = store.load_tiles(store._graph["tile_keys"])
+    full_edges = _edges(full)
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        keys = rng.choice(store._graph["tile_keys"], size=6)
+        keys = np.concatenate([keys, keys[:2]])
+        part = store.load_tiles(keys)
+        nodes = set(part.nodes.tolist())
+        assert len(nodes) == len(part.nodes)
+        assert _edges(part) == {(s, t) for s, t in full_edges if s in nodes and t in nodes}
+        leaving = {s for s, t in full_edges if s in nodes and t not in nodes}
+        assert set(part.nodes[part.boundary].tolist()) == leaving
+        assert part.graph.n_edges == len(_edges(part))
+
+
+def test_roads_reads_only_overlapping_tiles(store):
+    r = store._roads
+    box = np.asarray(r["bbox"])
+    lon, lat = box[:, [0, 2]].mean(), box[:, [1, 3]].mean()
+    bbox = (lon - 0.002, lat - 0.002, lon + 0.002, lat + 0.002)
+    expected = (box[:, 0] <= bbox[2]) & (box[:, 2] >= bbox[0]) & (box[:, 1] <= bbox[3]) & (box[:, 3] >= bbox[1])
+    frame = store.roads(bbox)
+    assert sorted(frame["row"]) == sorted(np.asarray(r["row"])[expected])
+    # The index visits only the tiles of the query box, however long other roads are
+    starts, stops = store._ranges(store.tiles(bbox), r["tile_keys"], r["tile_roads"])
+    assert (stops - starts).sum() < len(r["tile_index"])
+
+
+def test_queries_only_enumerate_the_stored_extent(store):
+    everything = store.tiles((-180.0, -90.0, 180.0, 90.0))
+    assert len(everything) <= store.n_cols * store.n_rows
+    assert np.isin(store._graph["tile_keys"], everything).all()
+    assert np.isin(store._roads["tile_keys"], everything).all()
+    assert len(store.tiles((store.lon0 + 10.0, store.lat0, store.lon0 + 11.0, store.lat0 + 1.0))) == 0
+    corridor = store.corridor_tiles([store.lon0 - 50.0, store.lon0 + 50.0], [store.lat0, store.lat0], margin=100.0)
+    assert np.isin(corridor, everything).all()